@@ -0,0 +1,94 @@
+"""
+Compare two directories of benchmark results written with `--benchmark-results`.
+
+    python -m mir_ci.compare BASE NEW [--threshold 0.1] [--alpha 0.01]
+
+Every metric and series the two runs of a test have in common is compared. Metrics and
+series are treated as lower-is-better (CPU time, memory, damage…). A series regresses
+when its median grows by more than the threshold and the Mann–Whitney U test says the
+change is significant, in which case the exit status is 1. Single numbers are reported
+when they change by more than the threshold, but can't be tested for significance.
+"""
+
+import argparse
+import pathlib
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from .lib.results import load_results, series_samples
+from .lib.stats import mann_whitney_u, percentile
+
+
+class Change(NamedTuple):
+    test: str
+    key: str
+    base: float
+    new: float
+    p_value: Optional[float]
+
+    @property
+    def relative(self) -> float:
+        if self.base == 0:
+            return 0.0 if self.new == 0 else float("inf")
+        return (self.new - self.base) / abs(self.base)
+
+
+def compare_results(base: Dict[str, Any], new: Dict[str, Any]) -> List[Change]:
+    changes: List[Change] = []
+    for test in sorted(base.keys() & new.keys()):
+        base_metrics, new_metrics = base[test]["metrics"], new[test]["metrics"]
+        for key in sorted(base_metrics.keys() & new_metrics.keys()):
+            changes.append(Change(test, key, base_metrics[key], new_metrics[key], None))
+        base_series, new_series = base[test]["series"], new[test]["series"]
+        for key in sorted(base_series.keys() & new_series.keys()):
+            if key.endswith("_seconds"):
+                continue
+            a = series_samples(key, base_series[key])
+            b = series_samples(key, new_series[key])
+            if a and b:
+                changes.append(Change(test, key, percentile(a, 50), percentile(b, 50), mann_whitney_u(a, b)))
+    return changes
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m mir_ci.compare", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("base", type=pathlib.Path, help="directory with the baseline results")
+    parser.add_argument("new", type=pathlib.Path, help="directory with the results to check")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change to report (default: 0.1)")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level (default: 0.01)")
+    parser.add_argument("--all", action="store_true", help="list unchanged metrics too")
+    args = parser.parse_args(argv)
+
+    base, new = load_results(args.base), load_results(args.new)
+    for test in sorted(base.keys() ^ new.keys()):
+        print(f"only in {'base' if test in base else 'new'}: {test}")
+
+    regressions = 0
+    current_test = None
+    for change in compare_results(base, new):
+        significant = change.p_value is not None and change.p_value < args.alpha
+        changed = abs(change.relative) > args.threshold
+        if not (changed or args.all):
+            continue
+        if change.test != current_test:
+            current_test = change.test
+            print(f"\n{change.test}")
+        if change.p_value is None:
+            verdict = "changed" if changed else ""
+        elif changed and significant:
+            verdict = "REGRESSION" if change.relative > 0 else "improvement"
+        else:
+            verdict = "not significant" if changed else ""
+        regressions += verdict == "REGRESSION"
+        p_value = "" if change.p_value is None else f"p={change.p_value:.3g}"
+        print(
+            f"  {change.key:<60} {change.base:>14.6g} → {change.new:<14.6g}",
+            f"{change.relative:+8.1%} {p_value:<12}{verdict}",
+        )
+
+    print(f"\n{regressions} significant regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
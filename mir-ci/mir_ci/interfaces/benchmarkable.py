@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from ..lib.cgroups import Cgroup
 
@@ -8,6 +9,13 @@ class Benchmarkable(ABC):
     async def get_cgroup(self) -> Cgroup:
         raise NotImplementedError
 
+    def get_process_group(self) -> Optional[int]:
+        """
+        The id of the process group to account for through `/proc` when `get_cgroup` raises
+        `CgroupUnavailableError`, if any.
+        """
+        return None
+
     @abstractmethod
     async def __aenter__(self):
         raise NotImplementedError
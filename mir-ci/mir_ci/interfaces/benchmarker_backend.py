@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import Dict
 
 from mir_ci.interfaces.benchmarkable import Benchmarkable
+from mir_ci.lib.samples import SampleBuffer
 
 
 class BenchmarkBackend(ABC):
@@ -9,6 +10,10 @@ class BenchmarkBackend(ABC):
     Abstract class that aggregates programs together and emits process stats as it is requested
     """
 
+    # Prefix for the keys of this backend in the `Benchmarker` report, set on registration,
+    # see `benchmarker.benchmark_backend()`. Empty for the backends that keep the historical keys.
+    namespace: str = ""
+
     @abstractmethod
     def add(self, name: str, program: Benchmarkable) -> None:
         """
@@ -23,3 +28,22 @@ class BenchmarkBackend(ABC):
     @abstractmethod
     def generate_report(self) -> Dict[str, object]:
         raise NotImplementedError
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        """
+        Report on the samples taken between the `start` and `end` monotonic timestamps
+        only. Backends that don't keep a time series report nothing.
+        """
+        return {}
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        """
+        The time series this backend keeps, by program name, so long runs can stream them
+        out before they wrap around, see `soak.SoakRecorder`.
+        """
+        return {}
+
+    def close(self) -> None:
+        """
+        Release any resources held for polling, once benchmarking is done.
+        """
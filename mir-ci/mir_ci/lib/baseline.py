@@ -0,0 +1,116 @@
+import fnmatch
+import pathlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+import yaml
+
+from .repeat import STATISTIC_METRICS
+from .results import ABSOLUTE_METRICS, OVERHEAD_METRICS, is_number
+
+
+class Tolerance(NamedTuple):
+    """
+    How much a metric may deviate from its baseline. `direction` is the one that is better,
+    "lower" for costs like CPU time or memory, "higher" for throughput. `action` is one of
+    "fail", "warn" or "ignore".
+    """
+
+    tolerance: float = 0.1
+    action: str = "fail"
+    direction: str = "lower"
+
+
+# Used after any tolerances given in the baseline file, `Tolerance()` if none match
+DEFAULT_TOLERANCES: Dict[str, Tolerance] = {
+    pattern: Tolerance(action="ignore") for pattern in (*OVERHEAD_METRICS, *ABSOLUTE_METRICS)
+}
+
+
+class Regression(NamedTuple):
+    key: str
+    baseline: float
+    value: float
+    tolerance: Tolerance
+
+    def __str__(self) -> str:
+        change = f"{(self.value - self.baseline) / abs(self.baseline):+.1%}" if self.baseline else "from zero"
+        return (
+            f"{self.key}: {self.value:g} vs baseline {self.baseline:g} ({change},"
+            f" tolerance {self.tolerance.tolerance:.0%}, {self.tolerance.direction} is better)"
+        )
+
+
+class Baseline:
+    """
+    Stored benchmark numbers per test, with per-metric tolerances, kept in a YAML file:
+
+    ```
+    tolerances:
+      "*_cpu_time_microseconds": 0.2                 # fail if 20% higher than the baseline
+      frame_count: {tolerance: 0.3, action: warn, direction: higher}
+    tests:
+      tests/test_screencopy_bandwidth.py::TestScreencopyBandwidth::test_compositor_alone[ubuntu_frame]:
+        compositor_cpu_time_microseconds: 412345
+    ```
+
+    Tolerances are matched against the metric name with `fnmatch`, in file order, the
+    first match wins.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.tolerances: Dict[str, Tolerance] = {}
+        self.tests: Dict[str, Dict[str, float]] = {}
+        if path.exists():
+            with open(path) as f:
+                data: Dict[str, Any] = yaml.safe_load(f) or {}
+            for pattern, tolerance in (data.get("tolerances") or {}).items():
+                self.tolerances[pattern] = (
+                    Tolerance(**tolerance) if isinstance(tolerance, dict) else Tolerance(float(tolerance))
+                )
+            self.tests = data.get("tests") or {}
+
+    def tolerance(self, key: str) -> Tolerance:
+        for pattern, tolerance in [*self.tolerances.items(), *DEFAULT_TOLERANCES.items()]:
+            if fnmatch.fnmatchcase(key, pattern):
+                return tolerance
+        return Tolerance()
+
+    @staticmethod
+    def metrics(properties: Iterable[Tuple[str, object]]) -> Dict[str, float]:
+        """
+        The numbers among `properties`, without the statistics of repeated runs, which vary
+        too much from one run to the next to be compared.
+        """
+        return {
+            key: value
+            for key, value in properties
+            if is_number(value) and not any(fnmatch.fnmatchcase(key, pattern) for pattern in STATISTIC_METRICS)
+        }
+
+    def check(self, test: str, properties: Iterable[Tuple[str, object]]) -> List[Regression]:
+        """
+        Return the metrics of `test` that regressed past their tolerance. Metrics without a
+        baseline are not checked.
+        """
+        regressions = []
+        baseline = self.tests.get(test, {})
+        for key, value in self.metrics(properties).items():
+            tolerance = self.tolerance(key)
+            if key not in baseline or tolerance.action == "ignore":
+                continue
+            change = (value - baseline[key]) * (1 if tolerance.direction == "lower" else -1)
+            if change > tolerance.tolerance * abs(baseline[key]):
+                regressions.append(Regression(key, baseline[key], value, tolerance))
+        return regressions
+
+    def update(self, test: str, properties: Iterable[Tuple[str, object]]) -> None:
+        self.tests[test] = self.metrics(properties)
+
+    def save(self) -> None:
+        data: Dict[str, Any] = {
+            "tolerances": {pattern: dict(tolerance._asdict()) for pattern, tolerance in self.tolerances.items()},
+            "tests": self.tests,
+        }
+        with open(self.path, "w") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
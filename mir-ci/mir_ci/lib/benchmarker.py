@@ -1,28 +1,192 @@
 import asyncio
 import logging
+import re
+import threading
+import time
 import warnings
 from contextlib import suppress
-from typing import Callable, Dict, List, Optional
+from resource import RUSAGE_SELF, getrusage
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar, cast
 
 from ..interfaces.benchmarkable import Benchmarkable
 from ..interfaces.benchmarker_backend import BenchmarkBackend
+from .cgroups import CgroupReader, CgroupUnavailableError
+from .procfs import (
+    read_context_switches,
+    read_process_group_usage,
+    read_smaps_rollup,
+    read_thread_stats,
+)
+from .results import CUMULATIVE_SERIES
+from .samples import DEFAULT_CAPACITY, SampleBuffer
+from .stats import percentile, rates, theil_sen_slope
 
 logger = logging.getLogger(__name__)
 
+BackendType = TypeVar("BackendType", bound=Type[BenchmarkBackend])
+
+_BACKENDS: Dict[str, Type[BenchmarkBackend]] = {}
+
+
+def benchmark_backend(name: str, namespace: Optional[str] = None) -> Callable[[BackendType], BackendType]:
+    """
+    Register a backend under `name`, so it can be picked with `create_backends`, e.g. from
+    the `benchmark_backends` marker or the `--benchmark-backends` option. Its report keys
+    are prefixed with `namespace`, `name` by default.
+
+    >>> @benchmark_backend("frobs")
+    >>> class FrobsBackend(BenchmarkBackend):
+            ...
+    """
+
+    def _wrap(cls: BackendType) -> BackendType:
+        assert name not in _BACKENDS, f"Benchmark backend already registered: {name}"
+        _BACKENDS[name] = cls
+        cls.namespace = name if namespace is None else namespace
+        return cls
+
+    return _wrap
+
+
+def backend_names() -> List[str]:
+    return sorted(_BACKENDS)
+
+
+def create_backends(names: Sequence[str]) -> List[BenchmarkBackend]:
+    """
+    Create a fresh instance of each of the backends registered under `names`.
+    """
+    if unknown := [name for name in names if name not in _BACKENDS]:
+        raise RuntimeError(f"Unknown benchmark backend(s): {', '.join(unknown)} (known: {', '.join(backend_names())})")
+    return [_BACKENDS[name]() for name in names]
+
 
 class Benchmarker:
-    def __init__(self, programs: Dict[str, Benchmarkable], poll_time_seconds: float = 1.0):
+    """
+    Runs the given programs and polls the backends about them every `poll_time_seconds`.
+
+    Polls are scheduled on absolute deadlines, so the time a poll takes doesn't delay the
+    following ones. If a poll overruns by one or more whole periods, the ticks that could
+    not happen are counted as missed rather than made up for. The jitter (how late each
+    poll starts) and the missed ticks are part of the report.
+
+    With `poll_thread`, backends are polled from a dedicated thread running its own event
+    loop, so stalls of the test's event loop (e.g. blocking Wayland roundtrips) don't skew
+    the sampling. The programs' cgroups are resolved before that thread starts.
+
+    `mark_phase` splits the run into named phases (e.g. "startup", then "steady" once the
+    programs settled), each reported on its own with the phase name as the key prefix, on
+    top of the numbers for the whole run. A phase lasts until the next one is marked or
+    benchmarking stops, and should span a few polls to be meaningful.
+
+    The backends' reports are merged, each key prefixed with its backend's `namespace`.
+
+    The CPU time and peak memory of the test process itself (Wayland clients like
+    `ScreencopyTracker`, the polling…) are sampled on every tick too, and reported along
+    with the ratio of its CPU time to the programs', to tell when the harness competes with
+    the programs under test for the CPU.
+    """
+
+    def __init__(
+        self,
+        programs: Dict[str, Benchmarkable],
+        poll_time_seconds: float = 1.0,
+        backends: Optional[Sequence[BenchmarkBackend]] = None,
+        poll_thread: bool = False,
+    ):
         self.programs = programs
-        self.backend: BenchmarkBackend = CgroupsBackend()
+        self.backends: List[BenchmarkBackend] = list(backends) if backends is not None else [CgroupsBackend()]
         self.poll_time_seconds = poll_time_seconds
+        self.poll_thread = poll_thread
         self.task: Optional[asyncio.Task[None]] = None
+        self.thread: Optional[threading.Thread] = None
+        self.thread_error: Optional[BaseException] = None
+        self.stop_event = threading.Event()
         self.running: bool = False
         self.running_programs: List[Benchmarkable] = []
+        self.tick_jitter = SampleBuffer(("seconds",))
+        self.harness = SampleBuffer(("cpu_time_microseconds", "max_rss_bytes"))
+        # The first harness sample's timestamp and CPU time, kept past the buffer wrapping
+        self.harness_start: Optional[Tuple[float, float]] = None
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.phases: List[Tuple[str, float]] = []
+        self.stop_time: Optional[float] = None
+
+    def mark_phase(self, name: str) -> None:
+        """
+        End the current phase, if any, and start phase `name`. Marking a phase before
+        entering the benchmarker makes it cover the programs' startup.
+        """
+        assert re.fullmatch(r"[a-z][a-z0-9_]*", name), f"Invalid phase name: {name}"
+        assert name not in (phase for phase, _ in self.phases), f"Phase already marked: {name}"
+        self.phases.append((name, time.monotonic()))
+
+    async def _poll(self) -> None:
+        await asyncio.gather(*(backend.poll() for backend in self.backends))
+
+    def _sample_harness(self) -> None:
+        # `process_time` covers every thread of the process, the poll thread included
+        timestamp, cpu_time_microseconds = time.monotonic(), time.process_time() * 10**6
+        if self.harness_start is None:
+            self.harness_start = (timestamp, cpu_time_microseconds)
+        # `ru_maxrss` is in kilobytes, and unlike `/proc/self/statm` costs no file reads per tick
+        max_rss_bytes = getrusage(RUSAGE_SELF).ru_maxrss * 1024
+        self.harness.append(timestamp, cpu_time_microseconds, max_rss_bytes)
+
+    def _start_tick(self, deadline: float) -> None:
+        now = time.monotonic()
+        self.tick_jitter.append(now, now - deadline)
+        self.ticks += 1
+        self._sample_harness()
+
+    def _next_deadline(self, deadline: float) -> float:
+        deadline += self.poll_time_seconds
+        late = time.monotonic() - deadline
+        if late >= self.poll_time_seconds:
+            missed = int(late // self.poll_time_seconds)
+            self.missed_ticks += missed
+            deadline += missed * self.poll_time_seconds
+        return deadline
 
     async def _run(self) -> None:
+        deadline = time.monotonic()
         while self.running:
-            await self.backend.poll()
-            await asyncio.sleep(self.poll_time_seconds)
+            self._start_tick(deadline)
+            await self._poll()
+            deadline = self._next_deadline(deadline)
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+
+    def _run_thread(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            deadline = time.monotonic()
+            while not self.stop_event.is_set():
+                self._start_tick(deadline)
+                loop.run_until_complete(self._poll())
+                deadline = self._next_deadline(deadline)
+                self.stop_event.wait(max(0.0, deadline - time.monotonic()))
+        except BaseException as e:
+            self.thread_error = e
+        finally:
+            loop.close()
+
+    async def _start_thread(self) -> None:
+        # Cgroup resolution happens on this loop, make sure it's done before another loop awaits it
+        for program in self.programs.values():
+            with suppress(Exception):
+                await program.get_cgroup()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run_thread, name="benchmarker", daemon=True)
+        self.thread.start()
+
+    async def _stop_thread(self) -> None:
+        assert self.thread
+        self.stop_event.set()
+        await asyncio.get_running_loop().run_in_executor(None, self.thread.join)
+        self.thread = None
+        if self.thread_error is not None:
+            raise self.thread_error
 
     async def __aenter__(self):
         if self.running is True:
@@ -33,13 +197,18 @@ class Benchmarker:
             for program_id, program in self.programs.items():
                 await program.__aenter__()
                 self.running_programs.insert(0, program)
-                self.backend.add(program_id, program)
+                for backend in self.backends:
+                    backend.add(program_id, program)
         except Exception as e:
             for program in self.running_programs:
                 await program.__aexit__()
             raise e
 
-        self.task = asyncio.ensure_future(self._run())
+        self._sample_harness()
+        if self.poll_thread:
+            await self._start_thread()
+        else:
+            self.task = asyncio.ensure_future(self._run())
         return self
 
     async def __aexit__(self, *args):
@@ -47,14 +216,21 @@ class Benchmarker:
             return
 
         self.running = False
+        self.stop_time = time.monotonic()
         try:
             if self.task:
                 self.task.cancel()
                 with suppress(asyncio.CancelledError):
                     await self.task
+            if self.thread:
+                await self._stop_thread()
         except Exception as e:
             raise e
         finally:
+            # Only once the poll thread is done, so it can't append to the buffer concurrently
+            self._sample_harness()
+            for backend in self.backends:
+                backend.close()
             exs = []
             for program in self.running_programs:
                 try:
@@ -64,28 +240,126 @@ class Benchmarker:
             if exs:
                 raise Exception("; ".join(str(ex) for ex in (exs)))
 
+    @staticmethod
+    def _merge(report: Dict[str, object], backend: BenchmarkBackend, backend_report: Dict[str, object]) -> None:
+        for key, value in backend_report.items():
+            key = f"{backend.namespace}_{key}" if backend.namespace else key
+            if key in report:
+                raise RuntimeError(f"Benchmark key reported by more than one backend: {key}")
+            report[key] = value
+
     def generate_report(self, record_property: Callable[[str, object], None]) -> None:
-        report = self.backend.generate_report()
+        report: Dict[str, object] = {}
+        for backend in self.backends:
+            self._merge(report, backend, backend.generate_report())
+        report.update(self._scheduling_report())
+        report.update(self._harness_report(report))
+        report.update(self._phases_report())
         for key, value in report.items():
             record_property(key, value)
 
+    def _scheduling_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        jitter = self.tick_jitter.column("seconds")
+        if jitter:
+            for pct in PERCENTILES:
+                result[f"benchmarker_tick_jitter_p{pct}_microseconds"] = int(percentile(jitter, pct) * 10**6)
+            result["benchmarker_tick_jitter_max_microseconds"] = int(max(jitter) * 10**6)
+            result["benchmarker_ticks"] = self.ticks
+            result["benchmarker_missed_ticks"] = self.missed_ticks
+        return result
+
+    def _harness_report(self, report: Dict[str, object]) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        timestamps = self.harness.timestamps()
+        if len(timestamps) < 2 or self.harness_start is None:
+            return result
+        # From the first sample rather than the buffer's oldest, which is gone once it wraps
+        start_time, start_cpu = self.harness_start
+        harness_cpu = int(self.harness.column("cpu_time_microseconds")[-1] - start_cpu)
+        result["benchmarker_harness_cpu_time_microseconds"] = harness_cpu
+        # CPU time per elapsed second, divided by 10^4 to get a percentage of one CPU
+        result["benchmarker_harness_cpu_percent"] = round(harness_cpu / (timestamps[-1] - start_time) / 10**4, 2)
+        result["benchmarker_harness_max_rss_bytes"] = int(max(self.harness.column("max_rss_bytes")))
+        # The programs' CPU time is only known with one of the cgroups backends
+        keys = [f"{name}_cpu_time_microseconds" for name in self.programs]
+        if all(key in report for key in keys) and (programs_cpu := sum(cast(int, report[key]) for key in keys)):
+            result["benchmarker_harness_overhead_ratio"] = round(harness_cpu / programs_cpu, 3)
+        return result
+
+    def _phases_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        ends = [start for _, start in self.phases[1:]] + [self.stop_time or time.monotonic()]
+        for (phase, start), end in zip(self.phases, ends):
+            result[f"benchmarker_phase_{phase}_seconds"] = round(end - start, 3)
+            report: Dict[str, object] = {}
+            for backend in self.backends:
+                self._merge(report, backend, backend.generate_phase_report(start, end))
+            result.update((f"{phase}_{key}", value) for key, value in report.items())
+        return result
+
+
+PERCENTILES = (50, 95, 99)
+
 
+def _cumulative_series(key: str, values: Sequence[float]) -> Dict[str, object]:
+    # Named so that comparisons take their increments, see `results.series_samples`
+    assert key.endswith(CUMULATIVE_SERIES), f"Cumulative series without a cumulative suffix: {key}"
+    return {key: [int(v) for v in values]}
+
+
+@benchmark_backend("cgroups", namespace="")
 class CgroupsBackend(BenchmarkBackend):
+    """
+    Samples the CPU time and memory use of each program's cgroup. Programs without a cgroup
+    of their own are accounted for through their process group in `/proc` instead, see
+    `Benchmarkable.get_process_group`.
+    """
+
     class ProcessInfo:
         program: Benchmarkable
         cpu_time_microseconds: int = 0
         mem_bytes_accumulator: int = 0
         mem_bytes_max: int = 0
         num_data_points: int = 0
+        process_group_fallback: bool = False
 
-        def __init__(self, program: Benchmarkable) -> None:
+        def __init__(self, program: Benchmarkable, capacity: int) -> None:
             self.program = program
+            self.samples = SampleBuffer(("cpu_time_microseconds", "mem_bytes"), capacity)
 
-    def __init__(self) -> None:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
         self.data_records: Dict[str, CgroupsBackend.ProcessInfo] = {}
+        self.capacity = capacity
 
     def add(self, name: str, program: Benchmarkable) -> None:
-        self.data_records[name] = CgroupsBackend.ProcessInfo(program)
+        self.data_records[name] = CgroupsBackend.ProcessInfo(program, self.capacity)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    def _record(self, name: str, timestamp: float, cpu_ms: int, mem_current: int, mem_max: int) -> None:
+        self.data_records[name].cpu_time_microseconds = cpu_ms
+        self.data_records[name].mem_bytes_accumulator += mem_current
+        self.data_records[name].mem_bytes_max = mem_max
+        self.data_records[name].num_data_points += 1
+        self.data_records[name].samples.append(timestamp, cpu_ms, mem_current)
+
+    def _poll_process_group(self, name: str, info: "CgroupsBackend.ProcessInfo", reason: Exception) -> None:
+        """
+        Account for a program without a cgroup through its process group in `/proc`, with
+        resident memory standing in for the cgroup's memory.
+        """
+        pgid = info.program.get_process_group()
+        if pgid is None:
+            warnings.warn(f"Ignoring cgroup read failure: {reason}")
+            return
+        if not info.process_group_fallback:
+            logger.warning(f"Accounting for {name} through its process group in /proc: {reason}")
+            info.process_group_fallback = True
+        if usage := read_process_group_usage(pgid):
+            cpu_ms, rss = usage
+            self._record(name, time.monotonic(), cpu_ms, rss, max(info.mem_bytes_max, rss))
 
     async def poll(self) -> None:
         for name, info in self.data_records.items():
@@ -97,13 +371,12 @@ class CgroupsBackend(BenchmarkBackend):
                     mem_max = cgroup.get_peak_memory()
                 except RuntimeError:
                     mem_max = max(self.data_records[name].mem_bytes_max, mem_current)
+            except CgroupUnavailableError as ex:
+                self._poll_process_group(name, info, ex)
             except RuntimeError as ex:
                 warnings.warn(f"Ignoring cgroup read failure: {ex}")
             else:
-                self.data_records[name].cpu_time_microseconds = cpu_ms
-                self.data_records[name].mem_bytes_accumulator += mem_current
-                self.data_records[name].mem_bytes_max = mem_max
-                self.data_records[name].num_data_points += 1
+                self._record(name, time.monotonic(), cpu_ms, mem_current, mem_max)
 
     def generate_report(self) -> Dict[str, object]:
         result: Dict[str, object] = {}
@@ -115,4 +388,585 @@ class CgroupsBackend(BenchmarkBackend):
             result[f"{name}_cpu_time_microseconds"] = info.cpu_time_microseconds
             result[f"{name}_max_mem_bytes"] = info.mem_bytes_max
             result[f"{name}_avg_mem_bytes"] = int(info.mem_bytes_accumulator / info.num_data_points)
+            result.update(self._series_report(name, info.samples))
+        return result
+
+    @staticmethod
+    def _series_report(name: str, samples: SampleBuffer) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        timestamps = samples.timestamps()
+        cpu = samples.column("cpu_time_microseconds")
+        mem = samples.column("mem_bytes")
+        if not timestamps:
+            return result
+        for pct in PERCENTILES:
+            result[f"{name}_p{pct}_mem_bytes"] = int(percentile(mem, pct))
+        # usage_usec per elapsed second, divided by 10^4 to get a percentage of one CPU
+        cpu_percent = [rate / 10**4 for rate in rates(timestamps, cpu)]
+        if cpu_percent:
+            for pct in PERCENTILES:
+                result[f"{name}_p{pct}_cpu_percent"] = round(percentile(cpu_percent, pct), 2)
+        if timestamps[-1] > timestamps[0]:
+            result[f"{name}_mem_growth_bytes_per_second"] = round(theil_sen_slope(timestamps, mem), 1)
+        result[f"{name}_series_seconds"] = [round(t - timestamps[0], 3) for t in timestamps]
+        result.update(_cumulative_series(f"{name}_series_cpu_time_microseconds", cpu))
+        result[f"{name}_series_mem_bytes"] = [int(v) for v in mem]
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            timestamps = info.samples.timestamps(start, end)
+            if not timestamps:
+                continue
+            cpu = info.samples.column("cpu_time_microseconds", start, end)
+            mem = info.samples.column("mem_bytes", start, end)
+            if timestamps[-1] > timestamps[0]:
+                result[f"{name}_mem_growth_bytes_per_second"] = round(theil_sen_slope(timestamps, mem), 1)
+            # CPU time is cumulative, count it from the last sample before the phase. Without
+            # one, the phase started with the program, whose counter started at zero - unless
+            # older samples were already overwritten.
+            before = info.samples.timestamps(None, start)
+            if before:
+                timestamps.insert(0, before[-1])
+                cpu.insert(0, info.samples.column("cpu_time_microseconds", None, start)[-1])
+            elif len(info.samples) < info.samples.capacity:
+                timestamps.insert(0, start)
+                cpu.insert(0, 0)
+            result[f"{name}_cpu_time_microseconds"] = int(cpu[-1] - cpu[0])
+            result[f"{name}_max_mem_bytes"] = int(max(mem))
+            result[f"{name}_avg_mem_bytes"] = int(sum(mem) / len(mem))
+            for pct in PERCENTILES:
+                result[f"{name}_p{pct}_mem_bytes"] = int(percentile(mem, pct))
+            cpu_percent = [rate / 10**4 for rate in rates(timestamps, cpu)]
+            if cpu_percent:
+                for pct in PERCENTILES:
+                    result[f"{name}_p{pct}_cpu_percent"] = round(percentile(cpu_percent, pct), 2)
+        return result
+
+
+@benchmark_backend("cgroups_hf", namespace="")
+class HighFrequencyCgroupsBackend(CgroupsBackend):
+    """
+    A `CgroupsBackend` for sampling at up to ~1 kHz, e.g. to catch short startup bursts.
+
+    The cgroup files of every program are opened once and then re-read with `preadv` into
+    preallocated buffers, all programs in a single pass sharing one timestamp. The cost of
+    each pass is reported so the overhead of the sampling itself can be judged.
+    """
+
+    def __init__(self, capacity: int = 2**16) -> None:
+        super().__init__(capacity)
+        self.readers: Dict[str, CgroupReader] = {}
+        self.sample_cost = SampleBuffer(("nanoseconds",), capacity)
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            if name not in self.readers:
+                try:
+                    cgroup = await info.program.get_cgroup()
+                    self.readers[name] = cgroup.open_reader()
+                except CgroupUnavailableError as ex:
+                    self._poll_process_group(name, info, ex)
+                except RuntimeError as ex:
+                    warnings.warn(f"Ignoring cgroup read failure: {ex}")
+
+        timestamp = time.monotonic()
+        start = time.perf_counter_ns()
+        for name, reader in self.readers.items():
+            try:
+                cpu_ms, mem_current, mem_peak = reader.read()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring cgroup read failure: {ex}")
+            else:
+                mem_max = max(self.data_records[name].mem_bytes_max, mem_current) if mem_peak is None else mem_peak
+                self._record(name, timestamp, cpu_ms, mem_current, mem_max)
+        if self.readers:
+            self.sample_cost.append(timestamp, time.perf_counter_ns() - start)
+
+    def close(self) -> None:
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
+
+    def generate_report(self) -> Dict[str, object]:
+        result = super().generate_report()
+        cost = self.sample_cost.column("nanoseconds")
+        if cost:
+            for pct in PERCENTILES:
+                result[f"cgroups_sample_cost_p{pct}_microseconds"] = round(percentile(cost, pct) / 1000, 1)
+            result["cgroups_sample_cost_max_microseconds"] = round(max(cost) / 1000, 1)
+        return result
+
+
+@benchmark_backend("psi")
+class PsiBackend(BenchmarkBackend):
+    """
+    Samples the cgroup Pressure Stall Information of each program, telling apart a program
+    that was starved of CPU, memory or IO from one that was simply idle.
+    """
+
+    RESOURCES = ("cpu", "memory", "io")
+    KINDS = ("some", "full")
+    FIELDS = ("avg10", "avg60", "total")
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            self.samples = SampleBuffer(
+                tuple(
+                    f"{resource}_{kind}_{field}"
+                    for resource in PsiBackend.RESOURCES
+                    for kind in PsiBackend.KINDS
+                    for field in PsiBackend.FIELDS
+                )
+            )
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, PsiBackend.ProcessInfo] = {}
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = PsiBackend.ProcessInfo(program)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                pressures = {resource: cgroup.get_pressure(resource) for resource in self.RESOURCES}
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring pressure read failure: {ex}")
+            else:
+                # Not every resource reports "full" stalls, count those as zero
+                info.samples.append(
+                    time.monotonic(),
+                    *(
+                        pressures[resource].get(kind, {}).get(field, 0.0)
+                        for resource in self.RESOURCES
+                        for kind in self.KINDS
+                        for field in self.FIELDS
+                    ),
+                )
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not len(info.samples):
+                raise RuntimeError(f"Failed to collect pressure data for {name}")
+            for resource in self.RESOURCES:
+                for kind in self.KINDS:
+                    prefix = f"{resource}_{kind}"
+                    avg10 = info.samples.column(f"{prefix}_avg10")
+                    avg60 = info.samples.column(f"{prefix}_avg60")
+                    total = info.samples.column(f"{prefix}_total")
+                    result[f"{name}_{prefix}_pressure_avg10"] = avg10[-1]
+                    result[f"{name}_{prefix}_pressure_avg60"] = avg60[-1]
+                    result[f"{name}_{prefix}_pressure_max_avg10"] = max(avg10)
+                    # Stall time is cumulative since the program's cgroup was created
+                    result[f"{name}_{prefix}_stall_microseconds"] = int(total[-1])
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not info.samples.timestamps(start, end):
+                continue
+            # Without a sample before the phase, it started with the program's cgroup, whose
+            # counters started at zero - unless older samples were already overwritten
+            count_from_zero = len(info.samples) < info.samples.capacity
+            for resource in self.RESOURCES:
+                for kind in self.KINDS:
+                    prefix = f"{resource}_{kind}"
+                    avg10 = info.samples.column(f"{prefix}_avg10", start, end)
+                    # Stall time is cumulative, count it from the last sample before the phase
+                    total = info.samples.column(f"{prefix}_total", None, end)
+                    first = len(total) - len(avg10)
+                    if first:
+                        stall = total[-1] - total[first - 1]
+                    else:
+                        stall = total[-1] - (0 if count_from_zero else total[0])
+                    result[f"{name}_{prefix}_pressure_max_avg10"] = max(avg10)
+                    result[f"{name}_{prefix}_stall_microseconds"] = int(stall)
+        return result
+
+
+@benchmark_backend("threads")
+class ThreadsBackend(BenchmarkBackend):
+    """
+    Attributes each program's CPU time to its threads by name, walking `/proc/<pid>/task`
+    for every process in the program's cgroup. Numbered workers (e.g. `llvmpipe-0`,
+    `llvmpipe-1`) are grouped together, and threads that exit during the run keep the CPU
+    time they were last seen with.
+    """
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            # (tid, start time) -> (thread name, cpu time in microseconds)
+            self.threads: Dict[Tuple[int, int], Tuple[str, int]] = {}
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, ThreadsBackend.ProcessInfo] = {}
+
+    @staticmethod
+    def thread_group(name: str) -> str:
+        return re.sub(r"[^0-9a-zA-Z]+", "_", re.sub(r"[-_:#]?[0-9]+$", "", name)).strip("_").lower() or "unnamed"
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = ThreadsBackend.ProcessInfo(program)
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                pids = cgroup.get_pids()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring cgroup read failure: {ex}")
+                continue
+            for pid in pids:
+                for tid, stat in read_thread_stats(pid).items():
+                    info.threads[(tid, stat.start_time)] = (stat.name, stat.cpu_time_microseconds)
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not info.threads:
+                raise RuntimeError(f"Failed to collect thread data for {name}")
+            groups: Dict[str, int] = {}
+            for thread_name, cpu_time_microseconds in info.threads.values():
+                group = self.thread_group(thread_name)
+                groups[group] = groups.get(group, 0) + cpu_time_microseconds
+            for group, cpu_time_microseconds in sorted(groups.items(), key=lambda item: -item[1]):
+                result[f"{name}_thread_{group}_cpu_time_microseconds"] = cpu_time_microseconds
+            result[f"{name}_thread_count"] = len(info.threads)
+        return result
+
+
+@benchmark_backend("smaps")
+class SmapsBackend(BenchmarkBackend):
+    """
+    Breaks each program's memory down by kind, summing `/proc/<pid>/smaps_rollup` over every
+    process in the program's cgroup. Unlike `memory.current` this leaves out the page cache,
+    and tells anonymous memory apart from shared memory (e.g. client buffers) and
+    file-backed pages.
+
+    Proportional (PSS) numbers divide shared pages between the processes mapping them, so
+    they add up across processes. RSS counts shared pages in full for every process.
+    """
+
+    # Reported name -> smaps_rollup field
+    FIELDS = {
+        "rss": "Rss",
+        "pss": "Pss",
+        "pss_anon": "Pss_Anon",
+        "pss_file": "Pss_File",
+        "pss_shmem": "Pss_Shmem",
+        "swap_pss": "SwapPss",
+    }
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            self.samples = SampleBuffer(tuple(SmapsBackend.FIELDS))
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, SmapsBackend.ProcessInfo] = {}
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = SmapsBackend.ProcessInfo(program)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                pids = cgroup.get_pids()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring cgroup read failure: {ex}")
+                continue
+            totals = dict.fromkeys(self.FIELDS.values(), 0)
+            found = False
+            for pid in pids:
+                smaps = read_smaps_rollup(pid)
+                found = found or bool(smaps)
+                for field in totals:
+                    totals[field] += smaps.get(field, 0)
+            if found:
+                info.samples.append(time.monotonic(), *totals.values())
+
+    def _memory_report(
+        self, name: str, info: "SmapsBackend.ProcessInfo", start: Optional[float] = None, end: Optional[float] = None
+    ) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for field in self.FIELDS:
+            values = info.samples.column(field, start, end)
+            if values:
+                result[f"{name}_{field}_avg_bytes"] = int(sum(values) / len(values))
+                result[f"{name}_{field}_max_bytes"] = int(max(values))
+        return result
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not len(info.samples):
+                raise RuntimeError(f"Failed to collect smaps data for {name}")
+            result.update(self._memory_report(name, info))
+            timestamps = info.samples.timestamps()
+            result[f"{name}_series_seconds"] = [round(t - timestamps[0], 3) for t in timestamps]
+            for field in self.FIELDS:
+                result[f"{name}_series_{field}_bytes"] = [int(v) for v in info.samples.column(field)]
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            result.update(self._memory_report(name, info, start, end))
+        return result
+
+
+@benchmark_backend("memory")
+class MemoryStatBackend(BenchmarkBackend):
+    """
+    Samples each program's cgroup `memory.stat`, telling heap (anon) from shared memory
+    buffers (shmem), page cache (file) and kernel memory, and `memory.events`, counting how
+    often the program was throttled for going over `memory.high`, hit `memory.max` or ran
+    out of memory.
+    """
+
+    STAT_FIELDS = ("anon", "file", "shmem", "kernel", "sock", "slab")
+    EVENTS = ("high", "max", "oom", "oom_kill")
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            self.samples = SampleBuffer(MemoryStatBackend.STAT_FIELDS + MemoryStatBackend.EVENTS)
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, MemoryStatBackend.ProcessInfo] = {}
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = MemoryStatBackend.ProcessInfo(program)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                stat = cgroup.get_memory_stat()
+                events = cgroup.get_memory_events()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring memory stat read failure: {ex}")
+            else:
+                # Older kernels lack some of the fields (e.g. "kernel" before 5.18), count those as zero
+                info.samples.append(
+                    time.monotonic(),
+                    *(stat.get(field, 0) for field in self.STAT_FIELDS),
+                    *(events.get(event, 0) for event in self.EVENTS),
+                )
+
+    def _stat_report(
+        self,
+        name: str,
+        info: "MemoryStatBackend.ProcessInfo",
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for field in self.STAT_FIELDS:
+            values = info.samples.column(field, start, end)
+            if values:
+                result[f"{name}_{field}_avg_bytes"] = int(sum(values) / len(values))
+                result[f"{name}_{field}_max_bytes"] = int(max(values))
+        return result
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not len(info.samples):
+                raise RuntimeError(f"Failed to collect memory stat data for {name}")
+            result.update(self._stat_report(name, info))
+            # The event counters start at zero with the program's cgroup
+            for event in self.EVENTS:
+                result[f"{name}_{event}_events"] = int(info.samples.column(event)[-1])
+            timestamps = info.samples.timestamps()
+            result[f"{name}_series_seconds"] = [round(t - timestamps[0], 3) for t in timestamps]
+            for field in self.STAT_FIELDS:
+                result[f"{name}_series_{field}_bytes"] = [int(v) for v in info.samples.column(field)]
+            for event in self.EVENTS:
+                result.update(_cumulative_series(f"{name}_series_{event}_events", info.samples.column(event)))
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not info.samples.timestamps(start, end):
+                continue
+            result.update(self._stat_report(name, info, start, end))
+            for event in self.EVENTS:
+                # Count from the last sample before the phase
+                counts = info.samples.column(event, None, end)
+                first = len(counts) - len(info.samples.timestamps(start, end))
+                result[f"{name}_{event}_events"] = int(counts[-1] - (counts[first - 1] if first else 0))
+        return result
+
+
+@benchmark_backend("throttling")
+class ThrottlingBackend(BenchmarkBackend):
+    """
+    Samples each program's cgroup CPU bandwidth throttling counters, which tell how much a
+    `CPUQuota` (see `Program` limits) held the program back. Without a quota, the counters
+    stay at zero.
+    """
+
+    FIELDS = ("nr_periods", "nr_throttled", "throttled_usec")
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            self.samples = SampleBuffer(ThrottlingBackend.FIELDS)
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, ThrottlingBackend.ProcessInfo] = {}
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = ThrottlingBackend.ProcessInfo(program)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                stat = cgroup.get_cpu_stat()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring cgroup read failure: {ex}")
+            else:
+                info.samples.append(time.monotonic(), *(stat.get(field, 0) for field in self.FIELDS))
+
+    @staticmethod
+    def _throttling_report(name: str, first: Sequence[float], last: Sequence[float]) -> Dict[str, object]:
+        periods, throttled, throttled_usec = (int(b - a) for a, b in zip(first, last))
+        return {
+            f"{name}_nr_throttled": throttled,
+            f"{name}_throttled_microseconds": throttled_usec,
+            f"{name}_throttled_percent": round(throttled * 100 / periods, 2) if periods else 0.0,
+        }
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not len(info.samples):
+                raise RuntimeError(f"Failed to collect throttling data for {name}")
+            # The counters start at zero with the program's cgroup
+            result.update(self._throttling_report(name, (0, 0, 0), [info.samples.column(f)[-1] for f in self.FIELDS]))
+            timestamps = info.samples.timestamps()
+            result[f"{name}_series_seconds"] = [round(t - timestamps[0], 3) for t in timestamps]
+            result.update(
+                _cumulative_series(f"{name}_series_throttled_microseconds", info.samples.column("throttled_usec"))
+            )
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            in_phase = len(info.samples.timestamps(start, end))
+            if not in_phase:
+                continue
+            # Count from the last sample before the phase, or from zero
+            columns = [info.samples.column(field, None, end) for field in self.FIELDS]
+            first = len(columns[0]) - in_phase - 1
+            result.update(
+                self._throttling_report(
+                    name, [column[first] if first >= 0 else 0 for column in columns], [column[-1] for column in columns]
+                )
+            )
+        return result
+
+
+@benchmark_backend("wakeups")
+class WakeupsBackend(BenchmarkBackend):
+    """
+    Counts the context switches of every thread in each program's cgroup, from
+    `/proc/<pid>/task/<tid>/status`. A thread switches out voluntarily whenever it blocks,
+    so voluntary switches per second measure how often a program wakes up: the cost of an
+    idle program that CPU time rounds down to nothing. Threads that exit during the run keep
+    the counts they were last seen with.
+    """
+
+    class ProcessInfo:
+        def __init__(self, program: Benchmarkable) -> None:
+            self.program = program
+            # (tid, start time) -> (voluntary, involuntary context switches)
+            self.threads: Dict[Tuple[int, int], Tuple[int, int]] = {}
+            self.samples = SampleBuffer(("voluntary", "involuntary"))
+
+    def __init__(self) -> None:
+        self.data_records: Dict[str, WakeupsBackend.ProcessInfo] = {}
+
+    def add(self, name: str, program: Benchmarkable) -> None:
+        self.data_records[name] = WakeupsBackend.ProcessInfo(program)
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {name: info.samples for name, info in self.data_records.items()}
+
+    async def poll(self) -> None:
+        for name, info in self.data_records.items():
+            try:
+                cgroup = await info.program.get_cgroup()
+                pids = cgroup.get_pids()
+            except RuntimeError as ex:
+                warnings.warn(f"Ignoring cgroup read failure: {ex}")
+                continue
+            for pid in pids:
+                info.threads.update(read_context_switches(pid))
+            if info.threads:
+                info.samples.append(
+                    time.monotonic(),
+                    sum(voluntary for voluntary, _ in info.threads.values()),
+                    sum(involuntary for _, involuntary in info.threads.values()),
+                )
+
+    @staticmethod
+    def _wakeups_report(name: str, timestamps: Sequence[float], voluntary: Sequence[float]) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        if len(timestamps) > 1 and timestamps[-1] > timestamps[0]:
+            result[f"{name}_wakeups_per_second"] = round(
+                (voluntary[-1] - voluntary[0]) / (timestamps[-1] - timestamps[0]), 1
+            )
+            result[f"{name}_max_wakeups_per_second"] = round(max(rates(timestamps, voluntary)), 1)
+        return result
+
+    def generate_report(self) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            if not len(info.samples):
+                raise RuntimeError(f"Failed to collect context switch data for {name}")
+            timestamps = info.samples.timestamps()
+            voluntary = info.samples.column("voluntary")
+            # Context switch counters start at zero with each thread
+            result[f"{name}_voluntary_context_switches"] = int(voluntary[-1])
+            result[f"{name}_involuntary_context_switches"] = int(info.samples.column("involuntary")[-1])
+            result.update(self._wakeups_report(name, timestamps, voluntary))
+            result[f"{name}_series_seconds"] = [round(t - timestamps[0], 3) for t in timestamps]
+            result.update(_cumulative_series(f"{name}_series_voluntary_context_switches", voluntary))
+        return result
+
+    def generate_phase_report(self, start: float, end: float) -> Dict[str, object]:
+        result: Dict[str, object] = {}
+        for name, info in self.data_records.items():
+            timestamps = info.samples.timestamps(start, end)
+            voluntary = info.samples.column("voluntary", start, end)
+            # Count from the last sample before the phase
+            before = info.samples.timestamps(None, start)
+            if before:
+                timestamps.insert(0, before[-1])
+                voluntary.insert(0, info.samples.column("voluntary", None, start)[-1])
+            result.update(self._wakeups_report(name, timestamps, voluntary))
         return result
@@ -1,11 +1,18 @@
 import asyncio
 import os
 import pathlib
-from typing import Iterator
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from mir_ci import SLOWDOWN
 
 
+class CgroupUnavailableError(RuntimeError):
+    """
+    The program has no cgroup of its own, e.g. cgroup v2 isn't available or the program
+    never left its parent's cgroup.
+    """
+
+
 class Cgroup:
     def __init__(self, path: pathlib.Path) -> None:
         self.path = path
@@ -31,7 +38,7 @@ class Cgroup:
             if path != parent_path:
                 return path
         else:
-            raise RuntimeError(f"Unable to read cgroup directory for pid: {pid}")
+            raise CgroupUnavailableError(f"Unable to read cgroup directory for pid: {pid}")
 
     @staticmethod
     def _get_cgroup_dir_internal(pid: int) -> pathlib.Path:
@@ -43,10 +50,13 @@ class Cgroup:
                 return pathlib.Path(f"/sys/fs/cgroup/{line[3:]}".strip())
         raise RuntimeError(f"Unable to find path for process with pid: {pid}")
 
+    def open_reader(self) -> "CgroupReader":
+        return CgroupReader(self.path)
+
     def _read_file(self, file_name: str) -> Iterator[str]:
         file_path = f"{self.path}/{file_name}"
         with open(file_path, "r") as file:
-            yield file.readline()
+            yield from file
 
     def get_cpu_time_microseconds(self) -> int:
         try:
@@ -70,3 +80,114 @@ class Cgroup:
             return int(next(self._read_file("memory.peak")))
         except Exception as ex:
             raise RuntimeError(f"Unable to get the peak memory for cgroup: {self.path}") from ex
+
+    def get_pids(self) -> List[int]:
+        try:
+            return [int(line) for line in self._read_file("cgroup.procs")]
+        except Exception as ex:
+            raise RuntimeError(f"Unable to get the processes for cgroup: {self.path}") from ex
+
+    def get_pressure(self, resource: str) -> Dict[str, Dict[str, float]]:
+        """
+        Read the Pressure Stall Information for `resource` (one of "cpu", "memory" or "io"),
+        returning e.g. `{"some": {"avg10": 0.0, "avg60": 0.0, "avg300": 0.0, "total": 0.0}, "full": {...}}`.
+        """
+        try:
+            result: Dict[str, Dict[str, float]] = {}
+            for line in self._read_file(f"{resource}.pressure"):
+                kind, *fields = line.split()
+                result[kind] = {key: float(value) for key, value in (field.split("=") for field in fields)}
+            if "some" not in result:
+                raise RuntimeError("some line not found")
+            return result
+        except Exception as ex:
+            raise RuntimeError(f"Unable to get the {resource} pressure for cgroup: {self.path}") from ex
+
+    def _read_keyed(self, file_name: str) -> Dict[str, int]:
+        try:
+            return {key: int(value) for key, value in (line.split() for line in self._read_file(file_name))}
+        except Exception as ex:
+            raise RuntimeError(f"Unable to get the {file_name} for cgroup: {self.path}") from ex
+
+    def get_cpu_stat(self) -> Dict[str, int]:
+        """
+        Read the cgroup's CPU statistics, e.g. `{"usage_usec": ..., "nr_periods": ..., "nr_throttled": ...,
+        "throttled_usec": ...}`. The throttling counters are only there with the cpu controller enabled.
+        """
+        return self._read_keyed("cpu.stat")
+
+    def get_memory_stat(self) -> Dict[str, int]:
+        """
+        Read the cgroup's memory breakdown, e.g. `{"anon": ..., "file": ..., "shmem": ...}`, mostly
+        in bytes, see `memory.stat` in the cgroup v2 documentation.
+        """
+        return self._read_keyed("memory.stat")
+
+    def get_memory_events(self) -> Dict[str, int]:
+        """
+        Read how many times the cgroup hit its memory limits, e.g. `{"high": ..., "max": ...,
+        "oom": ..., "oom_kill": ...}`.
+        """
+        return self._read_keyed("memory.events")
+
+
+class CgroupReader:
+    """
+    Keeps a cgroup's `cpu.stat`, `memory.current` and `memory.peak` open and re-reads them
+    with `preadv` into preallocated buffers, avoiding the open/close and string handling of
+    `Cgroup` when sampling at high frequency. Call `close()` when done.
+    """
+
+    BUFFER_SIZE = 4096
+    USAGE_USEC = b"usage_usec "
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._cpu_stat_fd = -1
+        self._memory_current_fd = -1
+        self._memory_peak_fd: Optional[int] = None
+        try:
+            self._cpu_stat_fd = os.open(path / "cpu.stat", os.O_RDONLY)
+            self._memory_current_fd = os.open(path / "memory.current", os.O_RDONLY)
+        except OSError as ex:
+            self.close()
+            raise RuntimeError(f"Unable to open cgroup: {path}") from ex
+        try:
+            self._memory_peak_fd = os.open(path / "memory.peak", os.O_RDONLY)
+        except FileNotFoundError:
+            # memory.peak is only available since Linux 5.19
+            pass
+        except OSError as ex:
+            self.close()
+            raise RuntimeError(f"Unable to open cgroup: {path}") from ex
+
+    def _pread(self, fd: int) -> int:
+        return os.preadv(fd, [self._buffer], 0)
+
+    def _read_int(self, fd: int) -> int:
+        return int(self._buffer[: self._pread(fd)])
+
+    def read(self) -> Tuple[int, int, Optional[int]]:
+        """
+        Read the cgroup's CPU time in microseconds, current memory and peak memory (None if
+        not supported) in one go.
+        """
+        try:
+            size = self._pread(self._cpu_stat_fd)
+            assert self._buffer.startswith(self.USAGE_USEC), "usage_usec line not found"
+            start = len(self.USAGE_USEC)
+            end = self._buffer.find(b"\n", 0, size)
+            cpu_time_microseconds = int(self._buffer[start:end] if end >= 0 else self._buffer[start:size])
+            memory_current = self._read_int(self._memory_current_fd)
+            memory_peak = None if self._memory_peak_fd is None else self._read_int(self._memory_peak_fd)
+        except Exception as ex:
+            raise RuntimeError(f"Unable to read cgroup: {self.path}") from ex
+        return cpu_time_microseconds, memory_current, memory_peak
+
+    def close(self) -> None:
+        for fd in (self._cpu_stat_fd, self._memory_current_fd, self._memory_peak_fd):
+            if fd is not None and fd >= 0:
+                os.close(fd)
+        self._cpu_stat_fd = self._memory_current_fd = -1
+        self._memory_peak_fd = None
@@ -0,0 +1,125 @@
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+CLOCK_TICKS_PER_SECOND = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+class ThreadStat(NamedTuple):
+    name: str
+    start_time: int
+    cpu_time_microseconds: int
+
+
+def parse_stat(content: str) -> Tuple[str, List[str]]:
+    """
+    Split the contents of a `/proc/<pid>/stat` file into the command name and the remaining
+    fields, starting with the state (field 3 in proc(5)). The command name is in parentheses
+    and may contain spaces or parentheses itself, hence the search from the right.
+    """
+    name_start = content.index("(") + 1
+    name_end = content.rindex(")")
+    fields_start = name_end + 2
+    return content[name_start:name_end], content[fields_start:].split()
+
+
+def ticks_to_microseconds(ticks: int) -> int:
+    return ticks * 1_000_000 // CLOCK_TICKS_PER_SECOND
+
+
+def read_context_switches(pid: int) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """
+    Read the voluntary and involuntary context switches of every thread of process `pid`,
+    keyed by thread id and start time, since thread ids get reused. Threads that exit while
+    being read are skipped.
+    """
+    result: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except FileNotFoundError:
+        return result
+    for tid in tids:
+        counts = {}
+        try:
+            with open(f"/proc/{pid}/task/{tid}/stat", "r") as stat_file:
+                _, fields = parse_stat(stat_file.read())
+            with open(f"/proc/{pid}/task/{tid}/status", "r") as status_file:
+                for line in status_file:
+                    key, _, value = line.partition(":")
+                    if key in ("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"):
+                        counts[key] = int(value)
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        if len(counts) == 2:
+            # starttime is field 22, and the list starts at field 3
+            result[(int(tid), int(fields[19]))] = (
+                counts["voluntary_ctxt_switches"],
+                counts["nonvoluntary_ctxt_switches"],
+            )
+    return result
+
+
+def read_thread_stats(pid: int) -> Dict[int, ThreadStat]:
+    """
+    Read the name, start time and user + system CPU time of every thread of process `pid`,
+    keyed by thread id. Threads that exit while being read are skipped.
+    """
+    result: Dict[int, ThreadStat] = {}
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except FileNotFoundError:
+        return result
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/stat", "r") as stat_file:
+                name, fields = parse_stat(stat_file.read())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        # utime, stime and starttime are fields 14, 15 and 22, and the list starts at field 3
+        result[int(tid)] = ThreadStat(name, int(fields[19]), ticks_to_microseconds(int(fields[11]) + int(fields[12])))
+    return result
+
+
+def read_smaps_rollup(pid: int) -> Dict[str, int]:
+    """
+    Read the memory totals of process `pid` from `/proc/<pid>/smaps_rollup`, in bytes, keyed by
+    field name (`Rss`, `Pss`, `Pss_Anon`, `SwapPss`…). Returns nothing for a process that is
+    gone or can't be inspected.
+    """
+    result: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as smaps_file:
+            for line in smaps_file:
+                key, _, value = line.partition(":")
+                fields = value.split()
+                if len(fields) == 2 and fields[1] == "kB":
+                    result[key] = int(fields[0]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return result
+
+
+def read_process_group_usage(pgid: int) -> Optional[Tuple[int, int]]:
+    """
+    Sum the CPU time in microseconds and the resident memory in bytes of every process in
+    process group `pgid`, or return None if there are none. CPU time includes the children
+    the processes waited for, so a group keeps the time of its members that exited, as long
+    as their parent was a member too. Resident memory counts shared pages once per process.
+    """
+    cpu_ticks = rss_pages = members = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", "r") as stat_file:
+                _, fields = parse_stat(stat_file.read())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        # pgrp is field 5, utime, stime, cutime and cstime fields 14 to 17 and rss field 24,
+        # and the list starts at field 3
+        if int(fields[2]) != pgid:
+            continue
+        members += 1
+        cpu_ticks += sum(int(field) for field in fields[11:15])
+        rss_pages += int(fields[21])
+    return (ticks_to_microseconds(cpu_ticks), rss_pages * PAGE_SIZE) if members else None
@@ -0,0 +1,61 @@
+import fnmatch
+import statistics
+from typing import Dict, List, Sequence, Tuple
+
+from .results import ABSOLUTE_METRICS, OVERHEAD_METRICS, is_number
+from .stats import confidence_interval_95
+
+Properties = List[Tuple[str, object]]
+
+# Added by `aggregate_runs` for every number, they describe the runs rather than the program
+STATISTIC_METRICS = ("*_stddev", "*_cv", "*_ci95_low", "*_ci95_high")
+
+
+def aggregate_runs(runs: Sequence[Properties]) -> Properties:
+    """
+    Combine the properties recorded by repeated runs of a test. Numbers recorded by every run
+    are replaced by their mean, and `_stddev`, `_cv` (coefficient of variation), `_ci95_low`,
+    `_ci95_high` and `_runs` (all values) properties are added. Anything else keeps the value
+    of the last run.
+    """
+    assert runs, "No runs to aggregate"
+    values: Dict[str, List[float]] = {}
+    for run in runs:
+        for key, value in run:
+            if is_number(value):
+                values.setdefault(key, []).append(value)  # type: ignore
+
+    result: Properties = []
+    for key, value in runs[-1]:
+        if key not in values or len(values[key]) != len(runs):
+            result.append((key, value))
+            continue
+        samples = values[key]
+        mean = statistics.fmean(samples)
+        stddev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+        low, high = confidence_interval_95(samples)
+        result += [
+            (key, mean),
+            (f"{key}_stddev", stddev),
+            (f"{key}_cv", stddev / abs(mean) if mean else 0.0),
+            (f"{key}_ci95_low", low),
+            (f"{key}_ci95_high", high),
+            (f"{key}_runs", samples),
+        ]
+    return result
+
+
+def unstable_metrics(properties: Properties, max_cv: float, patterns: Sequence[str] = ("*",)) -> List[str]:
+    """
+    Names of the aggregated metrics matching `patterns` whose coefficient of variation is
+    above `max_cv`. The harness' own overhead metrics, and those hovering around zero, are
+    never considered.
+    """
+    cvs = {key[: -len("_cv")]: value for key, value in properties if key.endswith("_cv") and is_number(value)}
+    return [
+        f"{key} (cv {cv:.1%})"
+        for key, cv in cvs.items()
+        if cv > max_cv  # type: ignore
+        and any(fnmatch.fnmatchcase(key, pattern) for pattern in patterns)
+        and not any(fnmatch.fnmatchcase(key, pattern) for pattern in (*OVERHEAD_METRICS, *ABSOLUTE_METRICS))
+    ]
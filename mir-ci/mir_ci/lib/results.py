@@ -0,0 +1,93 @@
+import csv
+import itertools
+import json
+import pathlib
+import re
+import time
+from typing import Any, Dict, Iterable, List, Tuple, TypeGuard, Union
+
+# Metrics describing the benchmarking harness itself rather than the programs under test
+OVERHEAD_METRICS = ("benchmarker_*", "cgroups_sample_cost_*")
+# Metrics hovering around zero, for which relative changes mean nothing, see `leak_check`
+ABSOLUTE_METRICS = ("*_mem_growth_bytes_per_second",)
+# Key suffixes of the sample series holding counters that only ever grow, see `series_samples`.
+# The backends name their cumulative series with one of these.
+CUMULATIVE_SERIES = ("_cpu_time_microseconds", "_throttled_microseconds", "_context_switches", "_events")
+
+
+def is_number(value: Any) -> TypeGuard[Union[int, float]]:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_series(value: Any) -> bool:
+    return isinstance(value, list) and len(value) > 0 and all(is_number(v) for v in value)
+
+
+def result_stem(nodeid: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", nodeid).strip("_")
+
+
+def split_properties(properties: Iterable[Tuple[str, object]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Sort recorded properties into numeric `metrics`, numeric `series` and everything else
+    as `metadata` (server mode, renderer, snap revision…).
+    """
+    result: Dict[str, Dict[str, Any]] = {"metadata": {}, "metrics": {}, "series": {}}
+    for key, value in properties:
+        if is_number(value):
+            result["metrics"][key] = value
+        elif is_series(value):
+            result["series"][key] = value
+        else:
+            result["metadata"][key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+    return result
+
+
+def write_result(
+    directory: pathlib.Path,
+    nodeid: str,
+    outcome: str,
+    properties: Iterable[Tuple[str, object]],
+    extra_metadata: Dict[str, Any] = {},
+) -> pathlib.Path:
+    """
+    Write the properties a test recorded to `<directory>/<test>.json`, along with a CSV of
+    its sample series, one column per series, if it recorded any.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    result = split_properties(properties)
+    result["metadata"].update(extra_metadata)
+    stem = result_stem(nodeid)
+    path = directory / f"{stem}.json"
+    with open(path, "w") as f:
+        json.dump(dict(test=nodeid, outcome=outcome, timestamp=time.time(), **result), f, indent=1)
+
+    if result["series"]:
+        with open(directory / f"{stem}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(result["series"].keys())
+            writer.writerows(itertools.zip_longest(*result["series"].values(), fillvalue=""))
+    return path
+
+
+def load_results(directory: pathlib.Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Load every result written by `write_result` into `directory`, keyed by test id.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(directory.glob("*.json")):
+        with open(path) as f:
+            result = json.load(f)
+        results[result["test"]] = result
+    return results
+
+
+def series_samples(key: str, values: List[float]) -> List[float]:
+    """
+    The samples to compare for a series: cumulative counters (CPU time, context switches…)
+    are compared by their per-sample increments, which don't grow with the length of the
+    run, everything else by value.
+    """
+    if key.endswith(CUMULATIVE_SERIES):
+        return [b - a for a, b in zip(values, values[1:])]
+    return values
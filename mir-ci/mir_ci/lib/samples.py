@@ -0,0 +1,81 @@
+import array
+import bisect
+from typing import Dict, Optional, Sequence, Tuple
+
+DEFAULT_CAPACITY = 4096
+
+
+class SampleBuffer:
+    """
+    Fixed-capacity ring buffer of timestamped samples.
+
+    Every column, including the timestamps, lives in its own preallocated `array.array` of
+    doubles, so a buffer costs `8 * (len(columns) + 1) * capacity` bytes no matter how long
+    the run is. Once full, the oldest samples are overwritten.
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int = DEFAULT_CAPACITY) -> None:
+        assert capacity > 0, "Sample buffer capacity must be positive"
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.capacity = capacity
+        self._timestamps = array.array("d", bytes(8 * capacity))
+        self._data: Dict[str, array.array] = {column: array.array("d", bytes(8 * capacity)) for column in columns}
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, *values: float) -> None:
+        assert len(values) == len(self.columns), f"Expected {len(self.columns)} values, got {len(values)}"
+        self._timestamps[self._head] = timestamp
+        for column, value in zip(self.columns, values):
+            self._data[column][self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def reserve(self, capacity: int) -> None:
+        """
+        Grow the buffer to hold at least `capacity` samples, keeping those it holds already.
+        """
+        if capacity <= self.capacity:
+            return
+        padding = array.array("d", bytes(8 * (capacity - self._size)))
+        self._timestamps = self._ordered(self._timestamps) + padding
+        self._data = {column: self._ordered(data) + padding for column, data in self._data.items()}
+        self._head = self._size
+        self.capacity = capacity
+
+    def last(self) -> Optional[Tuple[float, ...]]:
+        """
+        Return the most recent sample as `(timestamp, *values)`, or None if the buffer is empty.
+        """
+        if not self._size:
+            return None
+        index = (self._head - 1) % self.capacity
+        return (self._timestamps[index], *(self._data[column][index] for column in self.columns))
+
+    def _ordered(self, data: array.array) -> array.array:
+        if self._size < self.capacity:
+            return data[: self._size]
+        head = self._head
+        return data[head:] + data[:head]
+
+    def _window(self, start: Optional[float], end: Optional[float]) -> slice:
+        timestamps = self._ordered(self._timestamps)
+        lo = 0 if start is None else bisect.bisect_left(timestamps, start)
+        hi = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+        return slice(lo, hi)
+
+    def timestamps(self, start: Optional[float] = None, end: Optional[float] = None) -> array.array:
+        """
+        Return the timestamps in chronological order, optionally limited to `[start, end)`.
+        """
+        return self._ordered(self._timestamps)[self._window(start, end)]
+
+    def column(self, name: str, start: Optional[float] = None, end: Optional[float] = None) -> array.array:
+        """
+        Return the values of column `name` in chronological order, optionally limited to
+        samples timestamped within `[start, end)`.
+        """
+        return self._ordered(self._data[name])[self._window(start, end)]
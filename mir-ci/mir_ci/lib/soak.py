@@ -0,0 +1,194 @@
+import asyncio
+import json
+import pathlib
+import time
+from contextlib import suppress
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .benchmarker import Benchmarker
+from .results import is_series
+from .samples import SampleBuffer
+
+
+class SoakRecorder:
+    """
+    Streams a long-running `Benchmarker` to the append-only JSON Lines file at `path`, so
+    that runs of hours neither keep their history in memory nor lose it when interrupted.
+
+    Every `chunk_seconds`, the samples each backend took since the previous chunk are
+    appended, one `samples` line per backend and program, along with a `frames` line of
+    `frame_stats()` (e.g. `ScreencopyTracker.properties`) if given. Every
+    `checkpoint_seconds`, a `checkpoint` line with the report so far is appended too, see
+    `load_checkpoint`. Sample timestamps are in seconds since the recorder started. Runs
+    recorded to an existing log are appended after it.
+
+    The backends only keep their most recent samples (see `SampleBuffer`). Given the expected
+    `duration` of the run, the recorder grows their buffers on entry to hold every sample
+    polled in that time, so that the checkpoints and the final report cover the whole run.
+    That costs `8 * (columns + 1)` bytes per sample, e.g. 350 kB per program for 4 hours of
+    1 s polls of the cgroups backend. Without `duration`, the reports only cover what
+    the buffers hold, and chunks must be written before those wrap around: `chunk_seconds`
+    must be well below the buffers' capacity times the poll period.
+
+    ```
+    async with benchmarker, tracker, SoakRecorder(path, benchmarker, tracker.properties, duration=4 * 3600):
+        await asyncio.sleep(4 * 3600)
+    ```
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        benchmarker: Benchmarker,
+        frame_stats: Optional[Callable[[], Dict[str, Any]]] = None,
+        chunk_seconds: float = 10.0,
+        checkpoint_seconds: float = 300.0,
+        duration: Optional[float] = None,
+    ) -> None:
+        assert 0 < chunk_seconds <= checkpoint_seconds, f"Bad soak intervals: {chunk_seconds}s, {checkpoint_seconds}s"
+        self.path = path
+        self.benchmarker = benchmarker
+        self.frame_stats = frame_stats
+        self.chunk_seconds = chunk_seconds
+        self.checkpoint_seconds = checkpoint_seconds
+        self.duration = duration
+        self.file: Optional[TextIO] = None
+        self.task: Optional[asyncio.Task[None]] = None
+        self.start_time = 0.0
+        # Where the next chunk starts, the first one takes whatever the buffers hold already
+        self.chunk_end: Optional[float] = None
+        self.chunks = 0
+        self.checkpoints = 0
+
+    def _write(self, kind: str, **fields: Any) -> None:
+        assert self.file is not None, "Soak recorder not running"
+        self.file.write(json.dumps(dict(type=kind, time=time.time(), **fields)) + "\n")
+
+    def _buffers(self) -> Iterator[Tuple[str, str, SampleBuffer]]:
+        yield "benchmarker", "harness", self.benchmarker.harness
+        for backend in self.benchmarker.backends:
+            source = backend.namespace or type(backend).__name__
+            for name, buffer in backend.sample_buffers().items():
+                yield source, name, buffer
+
+    def reserve(self, duration: float) -> None:
+        """
+        Grow the benchmarker's buffers to hold the samples of another `duration` seconds,
+        with some room for late polls.
+        """
+        samples = int(duration / self.benchmarker.poll_time_seconds * 1.1) + 16
+        for buffer in (self.benchmarker.tick_jitter, *(buffer for _, _, buffer in self._buffers())):
+            buffer.reserve(len(buffer) + samples)
+
+    def write_chunk(self) -> None:
+        """
+        Append the samples taken since the previous chunk, and the current frame statistics.
+        """
+        start, end = self.chunk_end, time.monotonic()
+        for source, name, buffer in self._buffers():
+            timestamps = buffer.timestamps(start, end)
+            if not timestamps:
+                continue
+            columns = {column: list(buffer.column(column, start, end)) for column in buffer.columns}
+            seconds = [round(t - self.start_time, 3) for t in timestamps]
+            self._write("samples", backend=source, name=name, seconds=seconds, columns=columns)
+        if self.frame_stats is not None:
+            self._write("frames", seconds=round(end - self.start_time, 3), stats=self.frame_stats())
+        assert self.file is not None
+        self.file.flush()
+        self.chunk_end = end
+        self.chunks += 1
+
+    def write_checkpoint(self) -> None:
+        """
+        Append the report so far, without its sample series, which the chunks hold already.
+        Nothing is written before every backend has data to report on.
+        """
+        report: Dict[str, object] = {}
+        try:
+            self.benchmarker.generate_report(report.__setitem__)
+        except RuntimeError:
+            return
+        if self.frame_stats is not None:
+            report.update(self.frame_stats())
+        report = {key: value for key, value in report.items() if not is_series(value)}
+        self._write("checkpoint", seconds=round(time.monotonic() - self.start_time, 3), report=report)
+        assert self.file is not None
+        self.file.flush()
+        self.checkpoints += 1
+
+    async def _run(self) -> None:
+        next_checkpoint = self.start_time + self.checkpoint_seconds
+        while True:
+            await asyncio.sleep(max(0.0, (self.chunk_end or self.start_time) + self.chunk_seconds - time.monotonic()))
+            self.write_chunk()
+            if time.monotonic() >= next_checkpoint:
+                self.write_checkpoint()
+                next_checkpoint += self.checkpoint_seconds
+
+    async def __aenter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "a")
+        self.start_time = time.monotonic()
+        if self.duration is not None:
+            self.reserve(self.duration)
+        self._write(
+            "start", programs=list(self.benchmarker.programs), poll_time_seconds=self.benchmarker.poll_time_seconds
+        )
+        self.task = asyncio.ensure_future(self._run())
+        return self
+
+    async def __aexit__(self, *args):
+        assert self.task is not None and self.file is not None
+        self.task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self.task
+        try:
+            self.write_chunk()
+            self.write_checkpoint()
+        finally:
+            self.file.close()
+            self.file = None
+
+
+def read_soak_log(path: pathlib.Path) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the records of the last run in a `SoakRecorder` log, skipping a line cut short
+    by an interruption.
+    """
+    with open(path, "rb") as f:
+        start = offset = 0
+        for line in f:
+            if line.startswith(b'{"type": "start"'):
+                start = offset
+            offset += len(line)
+        f.seek(start)
+        for line in f:
+            with suppress(json.JSONDecodeError):
+                yield json.loads(line)
+
+
+def load_checkpoint(path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """
+    Return the report of the last checkpoint in a `SoakRecorder` log, if any.
+    """
+    report = None
+    for record in read_soak_log(path):
+        if record["type"] == "checkpoint":
+            report = record["report"]
+    return report
+
+
+def load_samples(path: pathlib.Path, backend: str, name: str) -> Dict[str, List[float]]:
+    """
+    Join the chunks of samples a `SoakRecorder` log holds for program `name` of `backend`
+    (its namespace, or its class name for the backends without one) into whole series,
+    keyed by column, with the timestamps under `seconds`.
+    """
+    series: Dict[str, List[float]] = {"seconds": []}
+    for record in read_soak_log(path):
+        if record["type"] == "samples" and record["backend"] == backend and record["name"] == name:
+            series["seconds"].extend(record["seconds"])
+            for column, values in record["columns"].items():
+                series.setdefault(column, []).extend(values)
+    return series
@@ -0,0 +1,92 @@
+import itertools
+import math
+import statistics
+from typing import List, Sequence, Tuple
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    Linearly interpolated percentile of `values`, with `pct` in `[0, 100]`.
+    """
+    assert values, "Cannot compute a percentile of no values"
+    assert 0 <= pct <= 100, f"Percentile out of range: {pct}"
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lo = math.floor(rank)
+    hi = math.ceil(rank)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def rates(timestamps: Sequence[float], values: Sequence[float]) -> List[float]:
+    """
+    Per-interval rate of change of the cumulative counter `values` sampled at `timestamps`,
+    in units per second. Intervals without any elapsed time are skipped.
+    """
+    return [(v1 - v0) / (t1 - t0) for t0, t1, v0, v1 in zip(timestamps, timestamps[1:], values, values[1:]) if t1 > t0]
+
+
+def theil_sen_slope(xs: Sequence[float], ys: Sequence[float], max_points: int = 400) -> float:
+    """
+    Theil–Sen estimate of the slope of `ys` over `xs`: the median of the slopes between every
+    pair of points. Unlike a least-squares fit, it isn't thrown off by up to ~29% of outliers
+    (e.g. a burst of allocations while a client starts). Longer series are evenly thinned out
+    to `max_points` first, to bound the quadratic cost.
+    """
+    assert len(xs) == len(ys), "Mismatched series"
+    if len(xs) > max_points:
+        indices = [i * len(xs) // max_points for i in range(max_points)]
+        xs, ys = [xs[i] for i in indices], [ys[i] for i in indices]
+    slopes = [(y1 - y0) / (x1 - x0) for (x0, y0), (x1, y1) in itertools.combinations(zip(xs, ys), 2) if x1 != x0]
+    assert slopes, "Cannot fit a slope to fewer than two points"
+    return percentile(slopes, 50)
+
+
+def mann_whitney_u(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    Two-sided p-value of the Mann–Whitney U test that samples `a` and `b` come from the same
+    distribution, using the normal approximation with a tie correction. Meant for the tens
+    to thousands of samples a benchmark series holds, not for tiny samples.
+    """
+    assert a and b, "Cannot compare empty samples"
+    n1, n2 = len(a), len(b)
+    ordered = sorted(itertools.chain(((v, 0) for v in a), ((v, 1) for v in b)))
+    rank_sum_a = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < len(ordered):
+        j = i
+        while j + 1 < len(ordered) and ordered[j + 1][0] == ordered[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        rank_sum_a += rank * sum(1 for _, group in itertools.islice(ordered, i, j + 1) if group == 0)
+        tie_term += ties**3 - ties
+        i = j + 1
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+# Two-sided 95% critical values of Student's t distribution for 1 to 30 degrees of freedom
+T_CRITICAL_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)  # fmt: skip
+
+
+def confidence_interval_95(values: Sequence[float]) -> Tuple[float, float]:
+    """
+    95% confidence interval of the mean of `values`, assuming they are roughly normal.
+    """
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, mean
+    df = len(values) - 1
+    t = T_CRITICAL_95[df - 1] if df <= len(T_CRITICAL_95) else 1.96
+    half_width = t * statistics.stdev(values) / math.sqrt(len(values))
+    return mean - half_width, mean + half_width
@@ -3,6 +3,7 @@ import os
 import re
 import subprocess
 import time
+from contextlib import suppress
 from typing import Any, Dict, Optional, Tuple
 
 import inotify.adapters
@@ -11,9 +12,11 @@ import yaml
 from ..interfaces.benchmarkable import Benchmarkable
 from ..lib.cgroups import Cgroup
 from ..program.app import App, AppType
-from ..program.program import Program
+from ..program.program import Program, ResourceLimits
+from ..wayland.startup_probe import StartupProbe
 
 display_appear_timeout = 10
+first_frame_timeout = 10
 min_mir_run_time = 0.1
 
 
@@ -46,8 +49,16 @@ def wait_for_wayland_display(runtime_dir: str, name: str) -> None:
 class DisplayServer(Benchmarkable):
     server: Optional[Program] = None
 
-    def __init__(self, app: App, add_extensions: Tuple[str, ...] = (), env: Dict[str, str] = {}) -> None:
+    def __init__(
+        self,
+        app: App,
+        add_extensions: Tuple[str, ...] = (),
+        env: Dict[str, str] = {},
+        measure_startup: bool = False,
+        limits: ResourceLimits = {},
+    ) -> None:
         self.app: App = app
+        self.limits = limits
         # Snaps require the display to be in the form "waland-<number>". The 00 prefix lets us
         # easily identify displays created by this test suit and remove them in bulk if a bunch
         # don't get cleaned up properly.
@@ -55,14 +66,25 @@ class DisplayServer(Benchmarkable):
         self.env: Dict[str, str] = env
         self.env["WAYLAND_DISPLAY"] = self.display_name
         self.env["MIR_SERVER_ADD_WAYLAND_EXTENSIONS"] = ":".join(add_extensions)
+        # With `measure_startup`, a client connects as soon as the socket appears to time how
+        # long until the registry roundtrip succeeds and, if screencopy is available (see
+        # `ScreencopyTracker.required_extensions`), until the first frame is ready
+        self.measure_startup = measure_startup
+        # Startup stage -> seconds since the server was spawned
+        self.startup_timings: Dict[str, float] = {}
 
     async def get_cgroup(self) -> Cgroup:
         assert self.server
         return await self.server.get_cgroup()
 
-    def program(self, app: App, env: Dict[str, str] = {}) -> Program:
+    def get_process_group(self) -> Optional[int]:
+        return self.server.get_process_group() if self.server else None
+
+    def program(self, app: App, env: Dict[str, str] = {}, limits: ResourceLimits = {}) -> Program:
         return Program(
-            app, env=dict({"DISPLAY": "no", "QT_QPA_PLATFORM": "wayland", "WAYLAND_DISPLAY": self.display_name}, **env)
+            app,
+            env=dict({"DISPLAY": "no", "QT_QPA_PLATFORM": "wayland", "WAYLAND_DISPLAY": self.display_name}, **env),
+            limits=limits,
         )
 
     def record_properties(self, fixture) -> None:
@@ -71,13 +93,38 @@ class DisplayServer(Benchmarkable):
             fixture("server_mode", m.group(1))
         if m := SERVER_RENDERER_RE.search(self.server.output):
             fixture("server_renderer", m.group(1))
+        if self.app.app_type == AppType.snap:
+            with suppress(OSError):
+                snap = self.server.name.split(".")[0]
+                fixture("server_snap_revision", os.readlink(f"/snap/{snap}/current"))
+        if self.limits:
+            fixture("server_limits", " ".join(f"{key}={value}" for key, value in self.limits.items()))
+        for stage, seconds in self.startup_timings.items():
+            fixture(f"server_startup_{stage}_seconds", round(seconds, 4))
+
+    async def _measure_startup(self, spawn_time: float) -> None:
+        probe = StartupProbe(self.display_name)
+        async with probe:
+            assert probe.registry_time is not None
+            self.startup_timings["registry"] = probe.registry_time - spawn_time
+            if probe.can_capture:
+                try:
+                    await asyncio.wait_for(probe.first_frame.wait(), first_frame_timeout)
+                except asyncio.TimeoutError as ex:
+                    raise RuntimeError(f"No frame on {self.display_name} within {first_frame_timeout}s") from ex
+                assert probe.first_frame_time is not None
+                self.startup_timings["first_frame"] = probe.first_frame_time - spawn_time
 
     async def __aenter__(self) -> "DisplayServer":
         runtime_dir = os.environ["XDG_RUNTIME_DIR"]
         clear_wayland_display(runtime_dir, self.display_name)
-        self.server = await Program(self.app, env=self.env).__aenter__()
+        spawn_time = time.monotonic()
+        self.server = await Program(self.app, env=self.env, limits=self.limits).__aenter__()
         try:
             wait_for_wayland_display(runtime_dir, self.display_name)
+            self.startup_timings = {"socket": time.monotonic() - spawn_time}
+            if self.measure_startup:
+                await self._measure_startup(spawn_time)
         except Exception as e:
             await self.server.kill()
             raise e
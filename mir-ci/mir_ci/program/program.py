@@ -4,10 +4,10 @@ import os
 import signal
 import uuid
 from pathlib import Path
-from typing import Awaitable, Dict, List, Optional, Tuple, Union
+from typing import Awaitable, Dict, List, Mapping, Optional, Tuple, Union
 
 from mir_ci.interfaces.benchmarkable import Benchmarkable
-from mir_ci.lib.cgroups import Cgroup
+from mir_ci.lib.cgroups import Cgroup, CgroupUnavailableError
 from mir_ci.program.app import AppType
 
 from .app import App
@@ -17,6 +17,9 @@ logger = logging.getLogger(__name__)
 default_wait_timeout = default_term_timeout = 10
 
 Command = Union[str, List[str], Tuple[str, ...]]
+# systemd resource control properties to run a program under, e.g. to emulate a low-end device:
+# `{"CPUQuota": "50%", "MemoryHigh": "384M", "MemoryMax": "512M", "AllowedCPUs": "0-1"}`
+ResourceLimits = Mapping[str, str]
 
 
 def format_output(name: str, output: str) -> str:
@@ -42,7 +45,7 @@ class ProgramError(RuntimeError):
 
 
 class Program(Benchmarkable):
-    def __init__(self, app: App, env: Dict[str, str] = {}):
+    def __init__(self, app: App, env: Dict[str, str] = {}, limits: ResourceLimits = {}):
         if isinstance(app.command, str):
             self.command: tuple[str, ...] = (app.command,)
         else:
@@ -51,6 +54,7 @@ class Program(Benchmarkable):
 
         self.name = self.command[0]
         self.env = env
+        self.limits = limits
         self.process: Optional[asyncio.subprocess.Process] = None
         self.process_end: Optional[Awaitable[None]] = None
         self.send_signals_task: Optional[asyncio.Task[None]] = None
@@ -62,10 +66,17 @@ class Program(Benchmarkable):
         return self.process is not None and self.process.returncode is None
 
     async def get_cgroup(self) -> Cgroup:
-        assert self.cgroups_task is not None, "Cgroup task is None, is cgroupv2 supported?"
+        if self.cgroups_task is None:
+            raise CgroupUnavailableError(f"No cgroup for {self.name}, is cgroupv2 supported?")
         await self.cgroups_task
         return self.cgroups_task.result()
 
+    def get_process_group(self) -> Optional[int]:
+        # The process is started with `setsid`, making it the leader of its own process group
+        if self.process is not None and self.process.returncode is None:
+            return self.process.pid
+        return None
+
     async def send_kill_signals(self, timeout: int, term_timeout: int) -> None:
         """Assigned to self.send_signals_task, cancelled when process ends"""
         assert self.is_running(), self.name + " is dead"
@@ -107,11 +118,14 @@ class Program(Benchmarkable):
         if self.app_type != AppType.snap:
             scope = f"mirci-{uuid.uuid4()}.scope"
             prefix = ("systemd-run", "--user", "--quiet", "--scope", f"--unit={scope}")
-            command = (*prefix, *command)
+            properties = tuple(f"--property={key}={value}" for key, value in self.limits.items())
+            command = (*prefix, *properties, *command)
             # TODO: the global `env` and `xdg` marks should be amended with
             # app-local ones, so different programs can get different environments.
             env = dict(os.environ, **self.env)
         else:
+            if self.limits:
+                raise ProgramError(f"Resource limits are not supported for snaps, can't limit {self.name}")
             env = dict(
                 {
                     k: v
@@ -13,24 +13,269 @@ import distro
 import pytest
 from deepmerge import conservative_merger
 from mir_ci.fixtures.servers import server_params
+from mir_ci.interfaces.benchmarker_backend import BenchmarkBackend
+from mir_ci.lib import repeat, results
+from mir_ci.lib.baseline import Baseline
+from mir_ci.lib.benchmarker import backend_names, create_backends
 from mir_ci.program import app
+from mir_ci.program.program import ResourceLimits
 
 RELEASE_PPA = "mir-team/release"
 RELEASE_PPA_ENTRY = f"https://ppa.launchpadcontent.net/{RELEASE_PPA}/ubuntu {distro.codename()}/main"
 APT_INSTALL = ("sudo", "DEBIAN_FRONTEND=noninteractive", "apt-get", "install", "--yes")
 PIP = ("python3", "-m", "pip")
 DEP_FIXTURES = {"any_server", "deps"}  # these are all the fixtures changing their behavior on `--deps`
+CALL_OUTCOME = pytest.StashKey[str]()
+BASELINE = pytest.StashKey[Baseline]()
+BASELINE_WARNINGS = pytest.StashKey[List[str]]()
 
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "deps: mark test with its required dependencies")
     config.addinivalue_line("markers", "xdg: mark tests with XDG_ environment contents")
     config.addinivalue_line("markers", "env: mark test with environment variables")
+    config.addinivalue_line(
+        "markers",
+        "benchmark_repeat(runs=1, warmup=0, max_cv=None, cv_metrics=('*',)):"
+        " repeat a benchmark and aggregate its numbers",
+    )
+    config.addinivalue_line(
+        "markers", "benchmark_backends(*names): the backends for the `benchmark_backends` fixture to create"
+    )
+    config.addinivalue_line(
+        "markers", "benchmark_poll_time(seconds): the poll period for the `benchmark_poll_time_seconds` fixture"
+    )
+    config.addinivalue_line(
+        "markers",
+        "leak_check(max_bytes_per_s, phase='steady'): fail if a program's memory grows faster than this",
+    )
+    config.addinivalue_line(
+        "markers", "resource_limits(**properties): systemd resource control properties for `resource_limits`"
+    )
+    config.addinivalue_line("markers", "soak: long-duration test, only run with `--soak-duration`")
+    if names := config.getoption("--benchmark-backends", None):
+        if unknown := set(names) - set(backend_names()):
+            raise pytest.UsageError(
+                f"Unknown --benchmark-backends: {', '.join(sorted(unknown))} (known: {', '.join(backend_names())})"
+            )
+    if path := config.getoption("--benchmark-baseline", None):
+        config.stash[BASELINE] = Baseline(path)
+        config.stash[BASELINE_WARNINGS] = []
 
 
 def pytest_addoption(parser):
     parser.addoption("--deps", help="Only install the test dependencies", action="store_true")
     parser.addoption("--robot-log", help="Location of the Robot log file", type=pathlib.Path)
+    parser.addoption(
+        "--benchmark-results",
+        help="Directory to write every test's recorded properties to, as JSON with a CSV of any sample series",
+        type=pathlib.Path,
+    )
+    parser.addoption(
+        "--benchmark-baseline",
+        help="YAML file with baseline numbers and tolerances to check `performance` tests against",
+        type=pathlib.Path,
+    )
+    parser.addoption(
+        "--benchmark-runs", help="How many times to run `performance` tests, aggregating their numbers", type=int
+    )
+    parser.addoption("--benchmark-warmup", help="How many discarded runs of `performance` tests to do first", type=int)
+    parser.addoption(
+        "--benchmark-max-cv",
+        help="Fail repeated `performance` tests with a coefficient of variation above this (e.g. 0.1)",
+        type=float,
+    )
+    parser.addoption(
+        "--benchmark-backends",
+        help="Comma-separated benchmark backends for `performance` tests to use (default: cgroups)",
+        type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+    )
+    parser.addoption(
+        "--benchmark-poll-time",
+        help="Seconds between benchmark polls of `performance` tests (default: 0.1, e.g. 0.001 with cgroups_hf)",
+        type=float,
+    )
+    parser.addoption(
+        "--resource-limits",
+        help="Comma-separated systemd resource control properties for the programs of tests using `resource_limits`"
+        " (e.g. CPUQuota=50%%,MemoryMax=512M,AllowedCPUs=0,2), can be given more than once",
+        type=_parse_resource_limits,
+        action="append",
+    )
+    parser.addoption(
+        "--benchmark-save",
+        help="Store the numbers of passing `performance` tests in the `--benchmark-baseline` file",
+        action="store_true",
+    )
+    parser.addoption(
+        "--soak-duration", help="How many seconds to run `soak` tests for (default: skip them)", type=float
+    )
+
+
+def _parse_resource_limits(value: str) -> ResourceLimits:
+    """
+    Parse `Key=value` systemd properties separated by commas. Only a comma followed by the
+    next `Key=` separates them, so values may hold commas too, e.g. `AllowedCPUs=0,2`.
+    """
+    limits = {}
+    for item in re.split(r",(?=\s*[A-Za-z]+=)", value):
+        if item.strip():
+            key, sep, limit = item.partition("=")
+            if not sep:
+                raise ValueError(f"Expected Key=value: {item}")
+            limits[key.strip()] = limit.strip()
+    return limits
+
+
+def _check_baseline(item: pytest.Item, report: pytest.TestReport) -> None:
+    """
+    Check the numbers a passing `performance` test recorded against the baseline, failing
+    the test or collecting a warning for those that regressed. With `--benchmark-save`,
+    update the baseline instead.
+    """
+    baseline = item.config.stash.get(BASELINE, None)
+    if baseline is None or not report.passed or item.get_closest_marker("performance") is None:
+        return
+    if item.config.getoption("--benchmark-save"):
+        baseline.update(item.nodeid, item.user_properties)
+        return
+    regressions = baseline.check(item.nodeid, item.user_properties)
+    if failures := [str(r) for r in regressions if r.tolerance.action == "fail"]:
+        report.outcome = "failed"
+        report.longrepr = "Performance regressed against the baseline:\n  " + "\n  ".join(failures)
+    item.config.stash[BASELINE_WARNINGS].extend(
+        f"{item.nodeid}: {r}" for r in regressions if r.tolerance.action == "warn"
+    )
+
+
+def _check_leaks(item: pytest.Item, report: pytest.TestReport) -> None:
+    """
+    Fail a passing test marked with `leak_check` if the memory of any of its programs grew
+    faster than `max_bytes_per_s`. The growth is taken over `phase` if the test marked it
+    (see `Benchmarker.mark_phase`), or over the whole run otherwise.
+
+    ```
+    @pytest.mark.leak_check(max_bytes_per_s=1024)
+    ```
+    """
+    mark = item.get_closest_marker("leak_check")
+    if mark is None or not report.passed:
+        return
+    args = dict(zip(("max_bytes_per_s", "phase"), mark.args), **mark.kwargs)
+    if args.get("max_bytes_per_s") is None:
+        report.outcome = "failed"
+        report.longrepr = "leak_check needs a max_bytes_per_s threshold"
+        return
+    max_bytes_per_s = float(args["max_bytes_per_s"])
+    phase: str = args.get("phase", "steady")
+    properties = dict(item.user_properties)
+    phases = [m.group(1) for key in properties if (m := re.fullmatch(r"benchmarker_phase_(\w+)_seconds", key))]
+    growth = {
+        key: value
+        for key, value in properties.items()
+        if key.endswith("_mem_growth_bytes_per_second")
+        and results.is_number(value)
+        and (key.startswith(f"{phase}_") if phase in phases else not any(key.startswith(f"{p}_") for p in phases))
+    }
+    if not growth:
+        report.outcome = "failed"
+        report.longrepr = "No memory growth recorded to check for leaks, is the test benchmarked?"
+    elif leaks := [f"{key}: {value:g} B/s" for key, value in growth.items() if value > max_bytes_per_s]:
+        report.outcome = "failed"
+        report.longrepr = f"Memory grew faster than {max_bytes_per_s:g} B/s:\n  " + "\n  ".join(leaks)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item: pytest.Item) -> Generator:
+    """
+    Repeat tests marked with `benchmark_repeat` (or `performance` tests, given `--benchmark-runs`
+    or `--benchmark-warmup`), discarding the warm-up runs and replacing the numbers recorded with
+    their statistics over the remaining runs, see `repeat.aggregate_runs`. With `max_cv`, fail if
+    any of the numbers varies too much to be trusted.
+
+    ```
+    @pytest.mark.benchmark_repeat(runs=5, warmup=1, max_cv=0.1, cv_metrics=("*_cpu_time_microseconds",))
+    ```
+    """
+    mark = item.get_closest_marker("benchmark_repeat")
+    options = {
+        "runs": item.config.getoption("--benchmark-runs", None),
+        "warmup": item.config.getoption("--benchmark-warmup", None),
+        "max_cv": item.config.getoption("--benchmark-max-cv", None),
+    }
+    if mark is None and (item.get_closest_marker("performance") is None or not (options["runs"] or options["warmup"])):
+        return (yield)
+
+    kwargs = dict({k: v for k, v in options.items() if v is not None}, **(mark.kwargs if mark else {}))
+    runs: int = kwargs.get("runs", 1)
+    warmup: int = kwargs.get("warmup", 0)
+    assert runs >= 1 and warmup >= 0, f"Bad benchmark repetitions: {runs} runs, {warmup} warm-up"
+
+    start = len(item.user_properties)
+    recorded: List[repeat.Properties] = []
+    for run in range(warmup + runs):
+        if run:
+            _renew_backends(item)
+        if run < warmup + runs - 1:
+            item.runtest()
+        else:
+            result = yield
+        if run >= warmup:
+            recorded.append(item.user_properties[start:])
+        del item.user_properties[start:]
+
+    item.user_properties.extend(repeat.aggregate_runs(recorded))
+    if (max_cv := kwargs.get("max_cv")) is not None:
+        if unstable := repeat.unstable_metrics(item.user_properties, max_cv, kwargs.get("cv_metrics", ("*",))):
+            pytest.fail(f"Too much variance over {runs} runs to trust: {', '.join(unstable)}", pytrace=False)
+    return result
+
+
+def _renew_backends(item: pytest.Item) -> None:
+    """
+    Replace the `benchmark_backends` of a repeated test with fresh ones, as its fixtures are
+    only set up once, so no run's samples carry over into the next.
+    """
+    if (backends := getattr(item, "funcargs", {}).get("benchmark_backends")) is not None:
+        backends[:] = [type(backend)() for backend in backends]
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    if session.config.getoption("--benchmark-save") and (baseline := session.config.stash.get(BASELINE, None)):
+        baseline.save()
+
+
+def pytest_terminal_summary(terminalreporter, config: pytest.Config) -> None:
+    if messages := config.stash.get(BASELINE_WARNINGS, None):
+        terminalreporter.section("performance warnings")
+        for message in messages:
+            terminalreporter.line(message)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_makereport(
+    item: pytest.Item, call: pytest.CallInfo
+) -> Generator[None, pytest.TestReport, pytest.TestReport]:
+    """
+    Check the test's numbers against the baseline and write the results once the test is torn
+    down, so properties recorded by fixtures are included.
+    """
+    report = yield
+    if report.when == "call":
+        _check_leaks(item, report)
+        _check_baseline(item, report)
+        item.stash[CALL_OUTCOME] = report.outcome
+    elif report.when == "teardown" and item.user_properties:
+        if directory := item.config.getoption("--benchmark-results", None):
+            callspec = getattr(item, "callspec", None)
+            results.write_result(
+                directory,
+                item.nodeid,
+                item.stash.get(CALL_OUTCOME, report.outcome),
+                item.user_properties,
+                {"params": callspec.id} if callspec else {},
+            )
+    return report
 
 
 def _find_pips(pips):
@@ -267,6 +512,132 @@ def env(request: pytest.FixtureRequest) -> Generator:
         yield
 
 
+@pytest.fixture(scope="function")
+def benchmark_backends(request: pytest.FixtureRequest) -> List[BenchmarkBackend]:
+    """
+    Fresh backends to pass to `Benchmarker`, as named by the `benchmark_backends` marker or
+    the `--benchmark-backends` option, in that order of preference, or just `cgroups`.
+
+    >>> @pytest.mark.benchmark_backends("cgroups", "psi")
+    >>> async def test_func(benchmark_backends):
+            async with Benchmarker(programs, backends=benchmark_backends) as benchmarker:
+                ...
+    """
+    if mark := request.node.get_closest_marker("benchmark_backends"):
+        names = list(mark.args)
+    else:
+        names = request.config.getoption("--benchmark-backends", None) or ["cgroups"]
+    # How much the limits hold the programs back is part of the picture
+    if _resource_limits(request) and "throttling" not in names:
+        names = [*names, "throttling"]
+    return create_backends(names)
+
+
+@pytest.fixture(scope="function")
+def benchmark_poll_time_seconds(request: pytest.FixtureRequest) -> float:
+    """
+    How often `Benchmarker` should poll its backends, as given by the `benchmark_poll_time`
+    marker or the `--benchmark-poll-time` option, in that order of preference, or 0.1 s.
+    Polling every millisecond takes the `cgroups_hf` backend.
+
+    >>> @pytest.mark.benchmark_poll_time(1.0)
+    >>> async def test_func(benchmark_backends, benchmark_poll_time_seconds):
+            async with Benchmarker(programs, benchmark_poll_time_seconds, backends=benchmark_backends):
+                ...
+    """
+    if mark := request.node.get_closest_marker("benchmark_poll_time"):
+        return float(mark.args[0])
+    return float(request.config.getoption("--benchmark-poll-time", None) or 0.1)
+
+
+def _resource_limits(request: pytest.FixtureRequest) -> ResourceLimits:
+    limits: dict[str, str] = {}
+    for option in request.config.getoption("--resource-limits", None) or ():
+        limits.update(option)
+    if mark := request.node.get_closest_marker("resource_limits"):
+        limits.update(mark.kwargs)
+    return limits
+
+
+def _snap_params(request: pytest.FixtureRequest) -> List[str]:
+    """
+    The commands of the snaps the test is parameterized with, through `any_server` or the
+    `deps` marks of its parameters.
+    """
+    specs = [
+        mark.kwargs and dict({"cmd": mark.args}, **mark.kwargs) or mark.args[0]
+        for mark in request.node.iter_markers("deps")
+    ]
+    callspec = getattr(request.node, "callspec", None)
+    if callspec and (server := callspec.params.get("any_server")):
+        specs.append(server().marks[0].kwargs)
+    return [
+        spec if isinstance(spec, str) else str(spec.get("snap") or spec.get("cmd"))
+        for spec in specs
+        if isinstance(spec, str) or spec.get("app_type") == app.AppType.snap
+    ]
+
+
+@pytest.fixture(scope="function")
+def resource_limits(request: pytest.FixtureRequest) -> ResourceLimits:
+    """
+    The systemd resource control properties to run the programs of a test under, from the
+    `--resource-limits` option, overridden by the `resource_limits` marker. Pass them on to
+    `DisplayServer` and its programs. Only non-snap programs can be limited, tests with snap
+    servers or apps are skipped when there are any limits.
+
+    >>> @pytest.mark.resource_limits(CPUQuota="50%", MemoryMax="512M", AllowedCPUs="0")
+    >>> async def test_func(any_server, resource_limits):
+            server = DisplayServer(any_server, limits=resource_limits)
+            async with server, server.program(app, limits=resource_limits):
+                ...
+    """
+    limits = _resource_limits(request)
+    if limits and not request.config.getoption("--deps", False) and (snaps := _snap_params(request)):
+        pytest.skip(f"Resource limits are not supported for snaps: {', '.join(snaps)}")
+    return limits
+
+
+def _artifact_path(request: pytest.FixtureRequest, tmp_path: pathlib.Path, suffix: str) -> pathlib.Path:
+    directory = request.config.getoption("--benchmark-results", None) or tmp_path
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{results.result_stem(request.node.nodeid)}.{suffix}"
+
+
+@pytest.fixture(scope="function")
+def soak_duration(request: pytest.FixtureRequest) -> float:
+    """
+    How long a `soak` test should run for, from the `--soak-duration` option. Skips the test
+    if not given.
+    """
+    if (duration := request.config.getoption("--soak-duration", None)) is None:
+        pytest.skip("soak tests need --soak-duration")
+    return float(duration)
+
+
+@pytest.fixture(scope="function")
+def soak_log(request: pytest.FixtureRequest, tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Where a `soak` test should stream its samples to, see `soak.SoakRecorder`: next to the
+    other results with `--benchmark-results`, in the test's temporary directory otherwise.
+
+    >>> @pytest.mark.soak
+    >>> async def test_func(soak_duration, soak_log):
+            async with benchmarker, SoakRecorder(soak_log, benchmarker, duration=soak_duration):
+                await asyncio.sleep(soak_duration)
+    """
+    return _artifact_path(request, tmp_path, "soak.jsonl")
+
+
+@pytest.fixture(scope="function")
+def damage_heatmap(request: pytest.FixtureRequest, tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Where a test should write the damage heatmap of its `ScreencopyTracker` to, next to the
+    other results with `--benchmark-results`, in the test's temporary directory otherwise.
+    """
+    return _artifact_path(request, tmp_path, "heatmap.png")
+
+
 @pytest.fixture(scope="session")
 def robot_log(request: pytest.FixtureRequest) -> pathlib.Path:
     return request.config.getoption("--robot-log") or pathlib.Path("log.html")
@@ -4,7 +4,6 @@ import os
 import shutil
 import subprocess
 import tempfile
-import time
 from io import BytesIO
 from typing import List
 
@@ -34,7 +33,8 @@ class Screencopy(ScreencopyTracker):
     def __init__(self) -> None:
         self.ROBOT_LIBRARY_LISTENER = self
         display_name = os.environ.get("WAYLAND_DISPLAY", "wayland-0")
-        super().__init__(display_name)
+        # A frame is analysed from one buffer while the next is captured into the other
+        super().__init__(display_name, buffers=2)
         self._rpa_images = Images()
 
     def _start_suite(self, data, result) -> None:
@@ -51,28 +51,33 @@ class Screencopy(ScreencopyTracker):
         :return: list of matched regions
         :raises ImageNotFoundError: if no match is found within the timeout
         """
-        regions = []
-        end_time = time.time() + float(timeout)
-        last_checked_frame_count = 0
+        await self.connect()
         screenshot = None
-        while time.time() <= end_time:
-            frame_count, screenshot = await asyncio.wait_for(self.grab_screenshot(), timeout)
-            if last_checked_frame_count != frame_count:
-                last_checked_frame_count = frame_count
+
+        # Only the latest frame is worth checking once done with the previous one
+        frames = self.frames(include_last=True)
+
+        async def find_template():
+            nonlocal screenshot
+            async for _ in frames:
+                screenshot = self._screenshot()[1]
                 try:
-                    regions = self._rpa_images.find_template_in_image(
+                    return self._rpa_images.find_template_in_image(
                         screenshot,
                         template,
                         tolerance=self.TOLERANCE,
                     )
                 except (RuntimeError, ValueError, ImageNotFoundError):
                     continue
-                else:
-                    break
-        else:
+
+        try:
+            regions = await asyncio.wait_for(find_template(), float(timeout))
+        except asyncio.TimeoutError:
             if screenshot:
                 self._log_failed_match(screenshot, template)
             raise ImageNotFoundError
+        finally:
+            await frames.aclose()
 
         return [
             {
@@ -91,31 +96,19 @@ class Screencopy(ScreencopyTracker):
         :return Tuple (frame count, Pillow Image of the frame)
         """
         await self.connect()
+        if self.frame_count == 0:
+            await self.next_frame()
+        return self._screenshot()
 
-        # Wait for the first frame
-        while self.frame_count == 0:
-            await asyncio.sleep(0)
-
+    def _screenshot(self):
         assert self.shm_data is not None, "No SHM data available"
-        self.shm_data.seek(0)
-        data = self.shm_data.read()
-        size = (self.buffer_width, self.buffer_height)
-        assert all(dim > 0 for dim in size), "Not enough image data"
-        stride = self.buffer_stride
-        image = Image.frombytes(
-            "RGBA",
-            size,
-            data,
-            "raw",
-            "RGBA",
-            stride,
-            ScreencopyTracker.FRAME_FLAGS.y_invert in self.frame_flags and -1 or 0,
-        )
-        b, g, r, a, *_ = image.split()
-        image = Image.merge("RGBA", (r, g, b, a))
-        image.save(f"{self._screenshots_dir}/{self.frame_count:010d}.png", compress_level=1)
+        assert self.buffer_width > 0 and self.buffer_height > 0, "Not enough image data"
+        with self.lease() as frame:
+            # A single copy, swapping the channels to RGBA, which the image then wraps
+            image = Image.fromarray(frame.pixels(rgba=True))
+        image.save(f"{self._screenshots_dir}/{frame.number:010d}.png", compress_level=1)
 
-        return (self.frame_count, image)
+        return (frame.number, image)
 
     async def connect(self):
         """Connect to the display."""
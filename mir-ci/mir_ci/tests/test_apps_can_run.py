@@ -8,6 +8,7 @@ from mir_ci.lib.benchmarker import Benchmarker
 from mir_ci.program.display_server import DisplayServer
 
 short_wait_time = 3 * SLOWDOWN
+startup_time = 1 * SLOWDOWN
 
 
 class TestAppsCanRun:
@@ -23,11 +24,20 @@ class TestAppsCanRun:
             apps.qterminal(),
         ],
     )
-    async def test_app_can_run(self, any_server, app, record_property) -> None:
-        server_instance = DisplayServer(any_server)
-        program = server_instance.program(app)
-        benchmarker = Benchmarker(OrderedDict(compositor=server_instance, client=program), poll_time_seconds=0.1)
+    async def test_app_can_run(
+        self, any_server, app, record_property, benchmark_backends, benchmark_poll_time_seconds, resource_limits
+    ) -> None:
+        server_instance = DisplayServer(any_server, limits=resource_limits)
+        program = server_instance.program(app, limits=resource_limits)
+        benchmarker = Benchmarker(
+            OrderedDict(compositor=server_instance, client=program),
+            poll_time_seconds=benchmark_poll_time_seconds,
+            backends=benchmark_backends,
+        )
+        benchmarker.mark_phase("startup")
         async with benchmarker:
+            await asyncio.sleep(startup_time)
+            benchmarker.mark_phase("steady")
             await asyncio.sleep(short_wait_time)
 
         server_instance.record_properties(record_property)
@@ -5,12 +5,15 @@ from pathlib import Path
 import pytest
 from mir_ci import SLOWDOWN
 from mir_ci.fixtures import apps, servers
+from mir_ci.lib.benchmarker import Benchmarker
+from mir_ci.lib.soak import SoakRecorder
 from mir_ci.program.app import App
 from mir_ci.program.display_server import DisplayServer
 from mir_ci.wayland.screencopy_tracker import ScreencopyTracker
 from mir_ci.wayland.virtual_pointer import Button, VirtualPointer
 
 long_wait_time = 10
+startup_wait_time = 1 * SLOWDOWN
 
 ASCIINEMA_CAST = f"{os.path.dirname(__file__)}/data/demo.cast"
 
@@ -39,23 +42,79 @@ class TestScreencopyBandwidth:
             apps.snap("mir-kiosk-neverputt", extra=False),
         ],
     )
-    async def test_active_app(self, record_property, server, app) -> None:
-        server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions)
+    async def test_active_app(self, record_property, server, app, resource_limits) -> None:
+        server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions, limits=resource_limits)
         tracker = ScreencopyTracker(server.display_name)
-        async with server as s, tracker, s.program(App(app.command[0], app.app_type)) as p:
+        async with server as s, tracker, s.program(App(app.command[0], app.app_type), limits=resource_limits) as p:
             if app.command[1]:
                 await asyncio.wait_for(p.wait(timeout=app.command[1]), timeout=app.command[1] + 1)
             else:
                 await asyncio.sleep(long_wait_time)
         _record_properties(record_property, server, tracker, 10)
 
+    @pytest.mark.benchmark_backends("cgroups", "wakeups")
     @pytest.mark.parametrize("server", servers.servers(servers.ServerCap.SCREENCOPY))
-    async def test_compositor_alone(self, record_property, server) -> None:
-        server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions)
+    async def test_compositor_alone(
+        self, record_property, server, resource_limits, benchmark_backends, benchmark_poll_time_seconds
+    ) -> None:
+        server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions, limits=resource_limits)
         tracker = ScreencopyTracker(server.display_name)
-        async with server, tracker:
+        benchmarker = Benchmarker(
+            {"compositor": server}, poll_time_seconds=benchmark_poll_time_seconds, backends=benchmark_backends
+        )
+        benchmarker.mark_phase("startup")
+        async with benchmarker, tracker:
+            await asyncio.sleep(startup_wait_time)
+            # Reported as idle_wakeups_compositor_wakeups_per_second
+            benchmarker.mark_phase("idle")
             await asyncio.sleep(long_wait_time)
         _record_properties(record_property, server, tracker, 1)
+        benchmarker.generate_report(record_property)
+
+    @pytest.mark.soak
+    # Hours of samples at a fixed, coarse period, whatever --benchmark-poll-time says
+    @pytest.mark.benchmark_poll_time(1.0)
+    @pytest.mark.parametrize("server", servers.servers(servers.ServerCap.SCREENCOPY))
+    @pytest.mark.parametrize(
+        "app",
+        [
+            apps.qterminal(
+                "--execute",
+                f"python3 -m asciinema play --loop {ASCIINEMA_CAST}",
+                pip_pkgs=("asciinema",),
+                id="asciinema",
+                extra=False,
+            ),
+        ],
+    )
+    async def test_soak(
+        self,
+        record_property,
+        server,
+        app,
+        resource_limits,
+        benchmark_backends,
+        benchmark_poll_time_seconds,
+        soak_duration,
+        soak_log,
+    ) -> None:
+        server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions, limits=resource_limits)
+        program = server.program(App(app.command[0], app.app_type), limits=resource_limits)
+        tracker = ScreencopyTracker(server.display_name)
+        benchmarker = Benchmarker(
+            {"compositor": server, "client": program},
+            poll_time_seconds=benchmark_poll_time_seconds,
+            backends=benchmark_backends,
+        )
+        benchmarker.mark_phase("startup")
+        soak = SoakRecorder(soak_log, benchmarker, tracker.properties, duration=startup_wait_time + soak_duration)
+        async with benchmarker, tracker, soak:
+            await asyncio.sleep(startup_wait_time)
+            benchmarker.mark_phase("steady")
+            await asyncio.sleep(soak_duration)
+        _record_properties(record_property, server, tracker, 10)
+        benchmarker.generate_report(record_property)
+        record_property("soak_log", str(soak_log))
 
     @pytest.mark.parametrize("server", servers.servers(servers.ServerCap.SCREENCOPY))
     @pytest.mark.parametrize(
@@ -66,12 +125,16 @@ class TestScreencopyBandwidth:
             apps.snap("mir-kiosk-kodi"),
         ],
     )
-    async def test_inactive_app(self, record_property, server, app) -> None:
+    async def test_inactive_app(self, record_property, server, app, damage_heatmap) -> None:
         server = DisplayServer(server, add_extensions=ScreencopyTracker.required_extensions)
-        tracker = ScreencopyTracker(server.display_name)
+        # Idle apps should leave redundant_frames_per_second near zero
+        tracker = ScreencopyTracker(server.display_name, hash_frames=True)
         async with server as s, tracker, s.program(app):
             await asyncio.sleep(long_wait_time)
         _record_properties(record_property, server, tracker, 2)
+        # Shows e.g. whether a blinking cursor damages more than the cursor
+        tracker.write_damage_heatmap(damage_heatmap)
+        record_property("damage_heatmap", str(damage_heatmap))
 
     @pytest.mark.deps(
         debs=(
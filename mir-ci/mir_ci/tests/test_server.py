@@ -1,5 +1,6 @@
 import pytest
 from mir_ci.program.display_server import DisplayServer
+from mir_ci.wayland.screencopy_tracker import ScreencopyTracker
 
 
 class TestServerCanRun:
@@ -7,3 +8,10 @@ class TestServerCanRun:
     async def test_server_can_run(self, any_server) -> None:
         async with DisplayServer(any_server) as any_server:
             pass
+
+    @pytest.mark.performance
+    async def test_server_startup_time(self, any_server, record_property) -> None:
+        server = DisplayServer(any_server, add_extensions=ScreencopyTracker.required_extensions, measure_startup=True)
+        async with server:
+            pass
+        server.record_properties(record_property)
@@ -1,21 +1,48 @@
 import asyncio
+import mmap
 import os
 import random
+import threading
 import time
+import zlib
 from collections import OrderedDict
 from contextlib import suppress
+from typing import Dict, List, Set, Tuple
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import ANY, MagicMock, Mock, call, mock_open, patch
 
+import numpy as np
 import pytest
+from mir_ci import compare, pytest_plugin
 from mir_ci.fixtures.servers import ServerCap, _mir_ci_server, servers
-from mir_ci.lib.benchmarker import Benchmarker, CgroupsBackend
-from mir_ci.lib.cgroups import Cgroup
+from mir_ci.interfaces.benchmarker_backend import BenchmarkBackend
+from mir_ci.lib import procfs, repeat, results
+from mir_ci.lib.baseline import Baseline, Tolerance
+from mir_ci.lib.benchmarker import (
+    Benchmarker,
+    CgroupsBackend,
+    HighFrequencyCgroupsBackend,
+    MemoryStatBackend,
+    PsiBackend,
+    SmapsBackend,
+    ThreadsBackend,
+    ThrottlingBackend,
+    WakeupsBackend,
+    backend_names,
+    create_backends,
+)
+from mir_ci.lib.cgroups import Cgroup, CgroupReader, CgroupUnavailableError
+from mir_ci.lib.samples import SampleBuffer
+from mir_ci.lib.soak import SoakRecorder, load_checkpoint, load_samples, read_soak_log
+from mir_ci.lib.stats import confidence_interval_95, mann_whitney_u, percentile, rates, theil_sen_slope
 from mir_ci.program.app import App, AppType
 from mir_ci.program.display_server import DisplayServer
-from mir_ci.program.program import Program
+from mir_ci.program.program import Program, ProgramError
+from mir_ci.wayland.damage import DamageLog, FrameHasher, union_area
 from mir_ci.wayland.output_watcher import OutputWatcher
-from mir_ci.wayland.protocols import WlOutput
+from mir_ci.wayland.protocols import WlOutput, WlShm
+from mir_ci.wayland.screencopy_tracker import ScreencopyTracker
+from mir_ci.wayland.startup_probe import StartupProbe
 
 
 def _async_return(mock=None):
@@ -88,15 +115,86 @@ class TestProgram:
             await p.kill(2)
 
     @patch("mir_ci.program.program.Path")
-    async def test_get_cgroup_asserts_without_cgroupv2(self, mock_path) -> None:
+    async def test_get_cgroup_raises_without_cgroupv2(self, mock_path) -> None:
         mock_path.return_value.exists.return_value = False
 
         p = Program(App(["sh", "-c", "sleep 100"], AppType.deb))
-        with pytest.raises(AssertionError, match="Cgroup task is None, is cgroupv2 supported?"):
+        with pytest.raises(CgroupUnavailableError, match="No cgroup for sh, is cgroupv2 supported?"):
             async with p:
+                assert p.process is not None
+                assert p.get_process_group() == p.process.pid
                 await p.get_cgroup()
 
 
+@pytest.mark.self
+class TestProgramLimits:
+    @patch("mir_ci.program.program.asyncio.create_subprocess_exec")
+    async def test_runs_under_limits(self, mock_exec) -> None:
+        mock_exec.side_effect = RuntimeError("not spawning")
+        p = Program(App(["sh", "-c", "true"], AppType.deb), limits={"CPUQuota": "50%", "AllowedCPUs": "0"})
+        with pytest.raises(RuntimeError, match="not spawning"):
+            await p.__aenter__()
+
+        command = mock_exec.call_args.args
+        assert command[0] == "systemd-run"
+        assert command[-5:] == ("--property=CPUQuota=50%", "--property=AllowedCPUs=0", "sh", "-c", "true")
+
+    async def test_cannot_limit_snaps(self) -> None:
+        p = Program(App(["some-snap"], AppType.snap), limits={"MemoryMax": "512M"})
+        with pytest.raises(ProgramError, match="Resource limits are not supported for snaps"):
+            await p.__aenter__()
+
+    def test_parses_limits(self) -> None:
+        assert pytest_plugin._parse_resource_limits("CPUQuota=50%, AllowedCPUs=0,2,MemoryMax=512M") == {
+            "CPUQuota": "50%",
+            "AllowedCPUs": "0,2",
+            "MemoryMax": "512M",
+        }
+        with pytest.raises(ValueError, match="Expected Key=value: 512M"):
+            pytest_plugin._parse_resource_limits("512M")
+
+    def test_merges_limits(self) -> None:
+        request = MagicMock()
+        request.config.getoption.return_value = [{"CPUQuota": "50%", "MemoryMax": "1G"}, {"AllowedCPUs": "0,2"}]
+        request.node.get_closest_marker.return_value = pytest.mark.resource_limits(MemoryMax="512M").mark
+        assert pytest_plugin._resource_limits(request) == {"CPUQuota": "50%", "MemoryMax": "512M", "AllowedCPUs": "0,2"}
+
+    def test_finds_snap_params(self) -> None:
+        request = MagicMock()
+        request.node.iter_markers.return_value = [
+            pytest.mark.deps(cmd=("qterminal",), debs=("qterminal",), app_type=AppType.deb).mark,
+            pytest.mark.deps(cmd=("mir-kiosk-neverputt",), snap="mir-kiosk-neverputt", app_type=AppType.snap).mark,
+        ]
+        request.node.callspec.params = {
+            "any_server": lambda: pytest.param(
+                App(["miriway"], AppType.snap), marks=pytest.mark.deps(snap="miriway", app_type=AppType.snap)
+            )
+        }
+        assert pytest_plugin._snap_params(request) == ["mir-kiosk-neverputt", "miriway"]
+
+        request.node.callspec.params = {}
+        request.node.iter_markers.return_value = [pytest.mark.deps(cmd=("pluma",), app_type=AppType.deb).mark]
+        assert pytest_plugin._snap_params(request) == []
+
+
+class SlowBackend(BenchmarkBackend):
+    def __init__(self, poll_seconds: float) -> None:
+        self.poll_seconds = poll_seconds
+        self.polls: List[float] = []
+        self.threads: Set[threading.Thread] = set()
+
+    def add(self, name, program) -> None:
+        pass
+
+    async def poll(self) -> None:
+        self.polls.append(time.monotonic())
+        self.threads.add(threading.current_thread())
+        await asyncio.sleep(self.poll_seconds)
+
+    def generate_report(self):
+        return {}
+
+
 @pytest.mark.self
 class TestBenchmarker(IsolatedAsyncioTestCase):
     def setUp(self) -> None:
@@ -129,6 +227,193 @@ class TestBenchmarker(IsolatedAsyncioTestCase):
         benchmarker.generate_report(callback)
         callback.assert_called()
 
+    async def test_benchmarker_merges_backend_reports(self) -> None:
+        p = self.create_program_mock()
+        b1 = MagicMock(namespace="")
+        b1.poll = Mock(return_value=_async_return())
+        b1.generate_report.return_value = {"one": 1}
+        b2 = MagicMock(namespace="ns")
+        b2.poll = Mock(return_value=_async_return())
+        b2.generate_report.return_value = {"two": 2}
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[b1, b2])
+        async with benchmarker:
+            pass
+
+        b1.add.assert_called_once_with("program", p)
+        b2.add.assert_called_once_with("program", p)
+        callback = Mock()
+        benchmarker.generate_report(callback)
+        callback.assert_has_calls([call("one", 1), call("ns_two", 2)])
+
+    async def test_benchmarker_reports_harness_overhead(self) -> None:
+        p = self.create_program_mock()
+        backend = MagicMock(namespace="")
+        backend.poll = Mock(return_value=_async_return())
+        backend.generate_report.return_value = {"program_cpu_time_microseconds": 1000}
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend])
+        async with benchmarker:
+            end = time.process_time() + 0.05
+            while time.process_time() < end:
+                pass
+
+        report: Dict[str, object] = {}
+        benchmarker.generate_report(report.__setitem__)
+        harness_cpu = report["benchmarker_harness_cpu_time_microseconds"]
+        assert isinstance(harness_cpu, int) and harness_cpu >= 50_000
+        # The busy loop's share of the wall time depends on the machine's load, so it's only
+        # known to have taken some
+        cpu_percent = report["benchmarker_harness_cpu_percent"]
+        assert isinstance(cpu_percent, float) and cpu_percent > 0
+        max_rss = report["benchmarker_harness_max_rss_bytes"]
+        assert isinstance(max_rss, int) and max_rss > 0
+        assert report["benchmarker_harness_overhead_ratio"] == round(harness_cpu / 1000, 3)
+
+    def test_benchmarker_reports_harness_cpu_past_wrapping(self) -> None:
+        p = self.create_program_mock()
+        benchmarker = Benchmarker({"program": p}, backends=[])
+        benchmarker.harness = SampleBuffer(("cpu_time_microseconds", "max_rss_bytes"), 4)
+        with patch("mir_ci.lib.benchmarker.time") as mock_time:
+            mock_time.monotonic.side_effect = [float(i) for i in range(10)]
+            mock_time.process_time.side_effect = [i / 10 for i in range(10)]
+            for _ in range(10):
+                benchmarker._sample_harness()
+
+        report: Dict[str, object] = {"program_cpu_time_microseconds": 1_800_000}
+        result = benchmarker._harness_report(report)
+        assert result["benchmarker_harness_cpu_time_microseconds"] == 900_000
+        assert result["benchmarker_harness_cpu_percent"] == 10.0
+        assert result["benchmarker_harness_overhead_ratio"] == 0.5
+
+    async def test_benchmarker_samples_harness_after_poll_thread(self) -> None:
+        p = self.create_program_mock()
+        backend = SlowBackend(0.2)
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend], poll_thread=True)
+        async with benchmarker:
+            await asyncio.sleep(0.1)
+
+        # Exiting while the poll thread is busy, the final sample waits for it
+        timestamps = list(benchmarker.harness.timestamps())
+        assert timestamps == sorted(timestamps)
+        assert timestamps[-1] > backend.polls[-1] + 0.2
+
+    async def test_benchmarker_rejects_key_collisions(self) -> None:
+        p = self.create_program_mock()
+        backends = [MagicMock(namespace=""), MagicMock(namespace="")]
+        for backend in backends:
+            backend.poll = Mock(return_value=_async_return())
+            backend.generate_report.return_value = {"program_cpu": 1}
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=backends)
+        async with benchmarker:
+            pass
+
+        with pytest.raises(RuntimeError, match="Benchmark key reported by more than one backend: program_cpu"):
+            benchmarker.generate_report(Mock())
+
+    def test_creates_registered_backends(self) -> None:
+        backends = create_backends(["cgroups", "psi", "smaps"])
+        assert [type(backend) for backend in backends] == [CgroupsBackend, PsiBackend, SmapsBackend]
+        assert [backend.namespace for backend in backends] == ["", "psi", "smaps"]
+        assert {"cgroups", "cgroups_hf", "psi", "smaps", "threads"} <= set(backend_names())
+        with pytest.raises(RuntimeError, match="Unknown benchmark backend.*: frobs"):
+            create_backends(["cgroups", "frobs"])
+
+    async def test_benchmarker_reports_phases(self) -> None:
+        p = self.create_program_mock()
+        backend = MagicMock(namespace="")
+        backend.poll = Mock(return_value=_async_return())
+        backend.generate_report.return_value = {"program_cpu": 3}
+        backend.generate_phase_report.side_effect = [{"program_cpu": 1}, {"program_cpu": 2}]
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend])
+        benchmarker.mark_phase("startup")
+        async with benchmarker:
+            await asyncio.sleep(0.2)
+            benchmarker.mark_phase("steady")
+            await asyncio.sleep(0.3)
+
+        report: Dict[str, object] = {}
+        benchmarker.generate_report(report.__setitem__)
+        assert report["program_cpu"] == 3
+        assert report["startup_program_cpu"] == 1
+        assert report["steady_program_cpu"] == 2
+        assert report["benchmarker_phase_startup_seconds"] == pytest.approx(0.2, abs=0.05)
+        assert report["benchmarker_phase_steady_seconds"] == pytest.approx(0.3, abs=0.05)
+        (startup_start, startup_end), (steady_start, steady_end) = (
+            c.args for c in backend.generate_phase_report.call_args_list
+        )
+        assert startup_end == steady_start
+        assert steady_end == benchmarker.stop_time
+
+    def test_benchmarker_rejects_repeated_phases(self) -> None:
+        benchmarker = Benchmarker({}, backends=[])
+        benchmarker.mark_phase("idle")
+        with pytest.raises(AssertionError, match="Phase already marked: idle"):
+            benchmarker.mark_phase("idle")
+        with pytest.raises(AssertionError, match="Invalid phase name"):
+            benchmarker.mark_phase("Not a key")
+
+    async def test_benchmarker_polls_do_not_drift(self) -> None:
+        p = self.create_program_mock()
+        backend = SlowBackend(0.05)
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend])
+        start = time.monotonic()
+        async with benchmarker:
+            await asyncio.sleep(1)
+        elapsed = time.monotonic() - start
+
+        # Polls scheduled relative to the end of the previous one would tick every 0.15s, so
+        # about 7 times. Scheduling delays on a loaded machine may cost a tick, or count one
+        # as missed, but not drift.
+        assert len(backend.polls) == benchmarker.ticks
+        assert abs(benchmarker.ticks + benchmarker.missed_ticks - elapsed / 0.1) <= 1.5
+        callback = Mock()
+        benchmarker.generate_report(callback)
+        callback.assert_any_call("benchmarker_ticks", benchmarker.ticks)
+        callback.assert_any_call("benchmarker_missed_ticks", benchmarker.missed_ticks)
+        callback.assert_any_call("benchmarker_tick_jitter_p50_microseconds", ANY)
+
+    async def test_benchmarker_polls_backends_concurrently(self) -> None:
+        p = self.create_program_mock()
+        backends = [SlowBackend(0.1), SlowBackend(0.1)]
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=1, backends=backends)
+        async with benchmarker:
+            await asyncio.sleep(0.05)
+
+        assert abs(backends[0].polls[0] - backends[1].polls[0]) < 0.01
+
+    async def test_benchmarker_counts_missed_ticks(self) -> None:
+        p = self.create_program_mock()
+        backend = SlowBackend(0.25)
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend])
+        async with benchmarker:
+            await asyncio.sleep(0.6)
+
+        # Polls at 0, 0.25 and 0.5, the ticks at 0.1, 0.3 and 0.4 don't happen
+        assert len(backend.polls) == 3
+        assert benchmarker.missed_ticks == 3
+
+    async def test_benchmarker_can_poll_on_a_thread(self) -> None:
+        p = self.create_program_mock()
+        backend = SlowBackend(0)
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend], poll_thread=True)
+        async with benchmarker:
+            time.sleep(0.5)  # stall the event loop, polling carries on regardless
+
+        p.get_cgroup.assert_called()
+        assert len(backend.polls) >= 5
+        assert threading.current_thread() not in backend.threads
+
+    async def test_benchmarker_reraises_thread_failure(self) -> None:
+        p = self.create_program_mock()
+        backend = SlowBackend(0)
+        backend.poll = Mock(side_effect=Exception("poll exception"))  # type: ignore
+        benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1, backends=[backend], poll_thread=True)
+
+        with pytest.raises(Exception, match="poll exception"):
+            async with benchmarker:
+                await asyncio.sleep(0.2)
+
+        p.__aexit__.assert_called_once()
+
     async def test_benchmarker_cant_enter_twice(self) -> None:
         p = self.create_program_mock()
         benchmarker = Benchmarker({"program": p}, poll_time_seconds=0.1)
@@ -228,7 +513,8 @@ class TestCGroupsBackend:
         pi = Mock()
         cg = Mock()
         pi.get_cgroup.return_value = _async_return(cg)
-        cg.get_current_memory.return_value = random.randint(0, 100)
+        cg.get_cpu_time_microseconds.return_value = random.randint(1, 100)
+        cg.get_current_memory.return_value = random.randint(1, 100)
         cg.get_peak_memory.side_effect = RuntimeError
 
         cgb = CgroupsBackend()
@@ -240,8 +526,92 @@ class TestCGroupsBackend:
             "pi_cpu_time_microseconds": cg.get_cpu_time_microseconds.return_value,
             "pi_max_mem_bytes": cg.get_current_memory.return_value,
             "pi_avg_mem_bytes": cg.get_current_memory.return_value,
+            "pi_p50_mem_bytes": cg.get_current_memory.return_value,
+            "pi_p95_mem_bytes": cg.get_current_memory.return_value,
+            "pi_p99_mem_bytes": cg.get_current_memory.return_value,
+            "pi_series_seconds": [0.0],
+            "pi_series_cpu_time_microseconds": [cg.get_cpu_time_microseconds.return_value],
+            "pi_series_mem_bytes": [cg.get_current_memory.return_value],
         }
 
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    async def test_reports_percentiles(self, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        mock_monotonic.side_effect = [0.0, 1.0, 2.0, 3.0, 4.0]
+        cg.get_cpu_time_microseconds.side_effect = [100_000, 200_000, 300_000, 400_000, 1_400_000]
+        cg.get_current_memory.side_effect = [10, 20, 30, 40, 1000]
+        cg.get_peak_memory.return_value = 1000
+
+        cgb = CgroupsBackend()
+        cgb.add("pi", pi)
+        for _ in range(5):
+            await cgb.poll()
+
+        report = cgb.generate_report()
+        assert report["pi_avg_mem_bytes"] == 220
+        assert report["pi_p50_mem_bytes"] == 30
+        assert report["pi_p99_mem_bytes"] == 961
+        assert report["pi_p50_cpu_percent"] == 10.0
+        assert report["pi_p99_cpu_percent"] == 97.3
+        assert report["pi_mem_growth_bytes_per_second"] == 10.0
+        assert report["pi_series_seconds"] == [0.0, 1.0, 2.0, 3.0, 4.0]
+        assert report["pi_series_mem_bytes"] == [10, 20, 30, 40, 1000]
+
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    async def test_reports_phases(self, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        mock_monotonic.side_effect = [0.5, 1.0, 2.0, 3.0, 4.0]
+        cg.get_cpu_time_microseconds.side_effect = [100_000, 200_000, 300_000, 400_000, 900_000]
+        cg.get_current_memory.side_effect = [10, 20, 30, 40, 1000]
+        cg.get_peak_memory.return_value = 1000
+
+        cgb = CgroupsBackend()
+        cgb.add("pi", pi)
+        for _ in range(5):
+            await cgb.poll()
+
+        startup = cgb.generate_phase_report(0.0, 2.0)
+        assert startup["pi_cpu_time_microseconds"] == 200_000
+        assert startup["pi_max_mem_bytes"] == 20
+        assert startup["pi_p50_cpu_percent"] == 20.0
+        steady = cgb.generate_phase_report(2.0, 4.0)
+        assert steady["pi_cpu_time_microseconds"] == 200_000
+        assert steady["pi_max_mem_bytes"] == 40
+        assert steady["pi_avg_mem_bytes"] == 35
+        assert steady["pi_p99_cpu_percent"] == 10.0
+        assert cgb.generate_phase_report(5.0, 6.0) == {}
+
+    @pytest.mark.parametrize("backend", [CgroupsBackend, HighFrequencyCgroupsBackend])
+    async def test_falls_back_to_process_group(self, backend):
+        pi = Mock()
+        pi.get_cgroup.side_effect = CgroupUnavailableError("no cgroup")
+        pi.get_process_group.return_value = os.getpgid(0)
+
+        cgb = backend()
+        cgb.add("pi", pi)
+        await cgb.poll()
+        await cgb.poll()
+
+        report = cgb.generate_report()
+        assert report["pi_cpu_time_microseconds"] > 0
+        assert report["pi_max_mem_bytes"] >= report["pi_avg_mem_bytes"] > 0
+        assert len(report["pi_series_mem_bytes"]) == 2
+
+    async def test_warns_without_process_group(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = CgroupUnavailableError("no cgroup")
+        pi.get_process_group.return_value = None
+
+        cgb = CgroupsBackend()
+        cgb.add("pi", pi)
+
+        with pytest.raises(UserWarning, match="Ignoring cgroup read failure: no cgroup"):
+            await cgb.poll()
+
     @pytest.mark.filterwarnings("ignore:Ignoring cgroup")
     async def test_raises_runtime_error_on_empty(self):
         pi = Mock()
@@ -256,6 +626,915 @@ class TestCGroupsBackend:
             cgb.generate_report()
 
 
+def _fake_cgroup(path, usage_usec=100, current=200, peak=300):
+    (path / "cpu.stat").write_text(f"usage_usec {usage_usec}\nuser_usec 60\nsystem_usec 40\n")
+    (path / "memory.current").write_text(f"{current}\n")
+    if peak is not None:
+        (path / "memory.peak").write_text(f"{peak}\n")
+    return Cgroup(path)
+
+
+@pytest.mark.self
+class TestHighFrequencyCgroupsBackend:
+    async def test_samples_through_persistent_readers(self, tmp_path):
+        cgroup = _fake_cgroup(tmp_path)
+        pi = Mock()
+        pi.get_cgroup.return_value = _async_return(cgroup)
+
+        cgb = HighFrequencyCgroupsBackend()
+        cgb.add("pi", pi)
+        await cgb.poll()
+        _fake_cgroup(tmp_path, usage_usec=150, current=100, peak=300)
+        await cgb.poll()
+        cgb.close()
+
+        pi.get_cgroup.assert_called_once()
+        report = cgb.generate_report()
+        assert report["pi_cpu_time_microseconds"] == 150
+        assert report["pi_max_mem_bytes"] == 300
+        assert report["pi_avg_mem_bytes"] == 150
+        assert report["cgroups_sample_cost_p50_microseconds"] > 0
+        assert not cgb.readers
+
+    @pytest.mark.filterwarnings("ignore:Ignoring cgroup")
+    async def test_raises_runtime_error_on_empty(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        cgb = HighFrequencyCgroupsBackend()
+        cgb.add("pi", pi)
+        await cgb.poll()
+
+        with pytest.raises(RuntimeError, match="Failed to collect benchmarking data"):
+            cgb.generate_report()
+
+
+@pytest.mark.self
+class TestCgroupReader:
+    def test_rereads_files(self, tmp_path):
+        reader = _fake_cgroup(tmp_path).open_reader()
+        assert reader.read() == (100, 200, 300)
+        _fake_cgroup(tmp_path, usage_usec=12345, current=67, peak=890)
+        assert reader.read() == (12345, 67, 890)
+        reader.close()
+
+    def test_works_without_peak(self, tmp_path):
+        reader = _fake_cgroup(tmp_path, peak=None).open_reader()
+        assert reader.read() == (100, 200, None)
+        reader.close()
+
+    def test_raises_when_missing(self, tmp_path):
+        with pytest.raises(RuntimeError, match=f"Unable to open cgroup: {tmp_path}"):
+            CgroupReader(tmp_path)
+
+    def test_closes_files_when_peak_fails(self, tmp_path):
+        _fake_cgroup(tmp_path)
+        real_open = os.open
+
+        def open_file(path, flags):
+            if path.name == "memory.peak":
+                raise PermissionError(13, "Permission denied")
+            return real_open(path, flags)
+
+        with patch("mir_ci.lib.cgroups.os.open", side_effect=open_file), patch(
+            "mir_ci.lib.cgroups.os.close", wraps=os.close
+        ) as mock_close:
+            with pytest.raises(RuntimeError, match=f"Unable to open cgroup: {tmp_path}"):
+                CgroupReader(tmp_path)
+        assert mock_close.call_count == 2
+
+    def test_raises_when_malformed(self, tmp_path):
+        _fake_cgroup(tmp_path)
+        (tmp_path / "cpu.stat").write_text("user_usec 60\n")
+        reader = CgroupReader(tmp_path)
+        with pytest.raises(RuntimeError, match=f"Unable to read cgroup: {tmp_path}"):
+            reader.read()
+        reader.close()
+
+
+@pytest.mark.self
+class TestPsiBackend:
+    @staticmethod
+    def pressure(total: float, avg10: float = 0.0):
+        line = {"avg10": avg10, "avg60": avg10 / 2, "avg300": 0.0, "total": total}
+        return {"some": line, "full": line}
+
+    async def test_reports_stall_time(self):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pressure.side_effect = [
+            *(self.pressure(1000) for _ in PsiBackend.RESOURCES),
+            self.pressure(6000, avg10=4.0),
+            self.pressure(1000),
+            self.pressure(1500),
+        ]
+
+        psi = PsiBackend()
+        psi.add("pi", pi)
+        await psi.poll()
+        await psi.poll()
+
+        report = psi.generate_report()
+        assert report["pi_cpu_some_stall_microseconds"] == 6000
+        assert report["pi_cpu_some_pressure_avg10"] == 4.0
+        assert report["pi_cpu_some_pressure_avg60"] == 2.0
+        assert report["pi_cpu_full_pressure_max_avg10"] == 4.0
+        assert report["pi_memory_some_stall_microseconds"] == 1000
+        assert report["pi_io_some_stall_microseconds"] == 1500
+
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    async def test_reports_phase_stall_time(self, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        totals = [1000, 3000, 7000]
+        cg.get_pressure.side_effect = [self.pressure(total) for total in totals for _ in PsiBackend.RESOURCES]
+        mock_monotonic.side_effect = [0.0, 1.0, 2.0]
+
+        psi = PsiBackend()
+        psi.add("pi", pi)
+        for _ in totals:
+            await psi.poll()
+
+        # Counted from the sample before the phase, or from zero for the first phase
+        assert psi.generate_phase_report(0.5, 2.5)["pi_cpu_some_stall_microseconds"] == 6000
+        assert psi.generate_phase_report(-1.0, 1.5)["pi_cpu_some_stall_microseconds"] == 3000
+
+        # Unless older samples were overwritten
+        wrapped = SampleBuffer(psi.data_records["pi"].samples.columns, 2)
+        for timestamp, total in zip([1.0, 2.0], totals[1:]):
+            wrapped.append(timestamp, *(total for _ in wrapped.columns))
+        psi.data_records["pi"].samples = wrapped
+        assert psi.generate_phase_report(-1.0, 2.5)["pi_cpu_some_stall_microseconds"] == 4000
+
+    async def test_warns_on_read_failure(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        psi = PsiBackend()
+        psi.add("pi", pi)
+
+        with pytest.raises(UserWarning, match="Ignoring pressure read failure: read error"):
+            await psi.poll()
+
+    @pytest.mark.filterwarnings("ignore:Ignoring pressure")
+    async def test_raises_runtime_error_on_empty(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        psi = PsiBackend()
+        psi.add("pi", pi)
+        await psi.poll()
+
+        with pytest.raises(RuntimeError, match="Failed to collect pressure data for pi"):
+            psi.generate_report()
+
+
+@pytest.mark.self
+class TestSmapsBackend:
+    @staticmethod
+    def smaps(rss: int, pss: int, shmem: int = 0):
+        return {"Rss": rss, "Pss": pss, "Pss_Anon": pss - shmem, "Pss_Shmem": shmem, "SwapPss": 0}
+
+    @patch("mir_ci.lib.benchmarker.read_smaps_rollup")
+    async def test_sums_processes(self, mock_read_smaps_rollup):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pids.return_value = [1, 2, 3]
+        mock_read_smaps_rollup.side_effect = [
+            self.smaps(100, 50, shmem=20),
+            self.smaps(200, 100),
+            {},
+            self.smaps(100, 50, shmem=40),
+            self.smaps(400, 250),
+            {},
+        ]
+
+        smaps = SmapsBackend()
+        smaps.add("pi", pi)
+        await smaps.poll()
+        await smaps.poll()
+
+        report = smaps.generate_report()
+        assert report["pi_rss_max_bytes"] == 500
+        assert report["pi_pss_avg_bytes"] == 225
+        assert report["pi_pss_shmem_max_bytes"] == 40
+        assert report["pi_pss_file_max_bytes"] == 0
+        assert report["pi_series_pss_anon_bytes"] == [130, 260]
+        assert len(report["pi_series_seconds"]) == 2
+
+    async def test_warns_on_read_failure(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        smaps = SmapsBackend()
+        smaps.add("pi", pi)
+
+        with pytest.raises(UserWarning, match="Ignoring cgroup read failure: read error"):
+            await smaps.poll()
+
+    @patch("mir_ci.lib.benchmarker.read_smaps_rollup")
+    async def test_raises_runtime_error_on_empty(self, mock_read_smaps_rollup):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pids.return_value = [1]
+        mock_read_smaps_rollup.return_value = {}
+
+        smaps = SmapsBackend()
+        smaps.add("pi", pi)
+        await smaps.poll()
+
+        with pytest.raises(RuntimeError, match="Failed to collect smaps data for pi"):
+            smaps.generate_report()
+
+
+@pytest.mark.self
+class TestMemoryStatBackend:
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    async def test_reports_breakdown_and_events(self, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        mock_monotonic.side_effect = [0.0, 1.0, 2.0]
+        cg.get_memory_stat.side_effect = [
+            {"anon": 100, "file": 50, "shmem": 10},
+            {"anon": 300, "file": 50, "shmem": 20, "kernel": 5},
+            {"anon": 200, "file": 50, "shmem": 30, "kernel": 5},
+        ]
+        cg.get_memory_events.side_effect = [{"high": 0, "max": 0}, {"high": 2, "max": 0}, {"high": 7, "max": 1}]
+
+        memory = MemoryStatBackend()
+        memory.add("pi", pi)
+        for _ in range(3):
+            await memory.poll()
+
+        report = memory.generate_report()
+        assert report["pi_anon_avg_bytes"] == 200
+        assert report["pi_anon_max_bytes"] == 300
+        assert report["pi_kernel_max_bytes"] == 5
+        assert report["pi_series_shmem_bytes"] == [10, 20, 30]
+        assert report["pi_high_events"] == 7
+        assert report["pi_oom_events"] == 0
+        assert report["pi_series_high_events"] == [0, 2, 7]
+        steady = memory.generate_phase_report(1.5, 3.0)
+        assert steady["pi_anon_max_bytes"] == 200
+        assert steady["pi_high_events"] == 5
+        assert steady["pi_max_events"] == 1
+
+    async def test_warns_on_read_failure(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        memory = MemoryStatBackend()
+        memory.add("pi", pi)
+
+        with pytest.raises(UserWarning, match="Ignoring memory stat read failure: read error"):
+            await memory.poll()
+
+    @pytest.mark.filterwarnings("ignore:Ignoring memory stat")
+    async def test_raises_runtime_error_on_empty(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        memory = MemoryStatBackend()
+        memory.add("pi", pi)
+        await memory.poll()
+
+        with pytest.raises(RuntimeError, match="Failed to collect memory stat data for pi"):
+            memory.generate_report()
+
+
+@pytest.mark.self
+class TestThrottlingBackend:
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    async def test_reports_throttling(self, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        mock_monotonic.side_effect = [0.0, 1.0, 2.0]
+        cg.get_cpu_stat.side_effect = [
+            {"usage_usec": 10, "nr_periods": 10, "nr_throttled": 1, "throttled_usec": 500},
+            {"usage_usec": 20, "nr_periods": 20, "nr_throttled": 6, "throttled_usec": 3000},
+            {"usage_usec": 30, "nr_periods": 40, "nr_throttled": 6, "throttled_usec": 3000},
+        ]
+
+        throttling = ThrottlingBackend()
+        throttling.add("pi", pi)
+        for _ in range(3):
+            await throttling.poll()
+
+        assert throttling.generate_report() == {
+            "pi_nr_throttled": 6,
+            "pi_throttled_microseconds": 3000,
+            "pi_throttled_percent": 15.0,
+            "pi_series_seconds": [0.0, 1.0, 2.0],
+            "pi_series_throttled_microseconds": [500, 3000, 3000],
+        }
+        assert throttling.generate_phase_report(0.5, 1.5) == {
+            "pi_nr_throttled": 5,
+            "pi_throttled_microseconds": 2500,
+            "pi_throttled_percent": 50.0,
+        }
+
+    async def test_reports_zero_without_cpu_controller(self):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_cpu_stat.return_value = {"usage_usec": 10, "user_usec": 5, "system_usec": 5}
+
+        throttling = ThrottlingBackend()
+        throttling.add("pi", pi)
+        await throttling.poll()
+
+        report = throttling.generate_report()
+        assert report["pi_nr_throttled"] == 0
+        assert report["pi_throttled_percent"] == 0.0
+
+
+@pytest.mark.self
+class TestWakeupsBackend:
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    @patch("mir_ci.lib.benchmarker.read_context_switches")
+    async def test_reports_wakeup_rate(self, mock_read_context_switches, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pids.return_value = [1]
+        mock_monotonic.side_effect = [0.0, 1.0, 2.0, 3.0]
+        mock_read_context_switches.side_effect = [
+            {(1, 10): (100, 1), (2, 10): (50, 0)},
+            {(1, 10): (300, 1), (2, 10): (50, 2)},
+            # thread 2 exited, keeping its counts
+            {(1, 10): (320, 3)},
+            {(1, 10): (340, 3)},
+        ]
+
+        wakeups = WakeupsBackend()
+        wakeups.add("pi", pi)
+        for _ in range(4):
+            await wakeups.poll()
+
+        report = wakeups.generate_report()
+        assert report["pi_voluntary_context_switches"] == 390
+        assert report["pi_involuntary_context_switches"] == 5
+        assert report["pi_wakeups_per_second"] == 80.0
+        assert report["pi_max_wakeups_per_second"] == 200.0
+        assert report["pi_series_voluntary_context_switches"] == [150, 350, 370, 390]
+        assert wakeups.generate_phase_report(1.5, 4.0) == {
+            "pi_wakeups_per_second": 20.0,
+            "pi_max_wakeups_per_second": 20.0,
+        }
+
+    @pytest.mark.filterwarnings("ignore:Ignoring cgroup")
+    async def test_raises_runtime_error_on_empty(self):
+        pi = Mock()
+        pi.get_cgroup.side_effect = RuntimeError("read error")
+
+        wakeups = WakeupsBackend()
+        wakeups.add("pi", pi)
+        await wakeups.poll()
+
+        with pytest.raises(RuntimeError, match="Failed to collect context switch data for pi"):
+            wakeups.generate_report()
+
+    @patch("mir_ci.lib.benchmarker.time.monotonic")
+    @patch("mir_ci.lib.benchmarker.read_context_switches")
+    async def test_keeps_threads_with_reused_ids_apart(self, mock_read_context_switches, mock_monotonic):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pids.return_value = [1]
+        mock_monotonic.side_effect = [0.0, 1.0]
+        mock_read_context_switches.side_effect = [
+            {(1, 10): (100, 1), (2, 10): (500, 0)},
+            # thread 2 exited and a new thread got its id
+            {(1, 10): (110, 1), (2, 20): (5, 0)},
+        ]
+
+        wakeups = WakeupsBackend()
+        wakeups.add("pi", pi)
+        for _ in range(2):
+            await wakeups.poll()
+
+        report = wakeups.generate_report()
+        assert report["pi_series_voluntary_context_switches"] == [600, 615]
+        assert report["pi_wakeups_per_second"] == 15.0
+
+
+@pytest.mark.self
+class TestThreadsBackend:
+    @patch("mir_ci.lib.benchmarker.read_thread_stats")
+    async def test_groups_threads_by_name(self, mock_read):
+        pi = Mock()
+        cg = Mock()
+        pi.get_cgroup.return_value = _async_return(cg)
+        cg.get_pids.return_value = [10]
+        mock_read.side_effect = [
+            {
+                10: procfs.ThreadStat("mir_demo_server", 1, 100),
+                11: procfs.ThreadStat("llvmpipe-0", 1, 200),
+                12: procfs.ThreadStat("llvmpipe-1", 1, 300),
+            },
+            {
+                10: procfs.ThreadStat("mir_demo_server", 1, 150),
+                11: procfs.ThreadStat("llvmpipe-0", 1, 250),
+            },
+        ]
+
+        threads = ThreadsBackend()
+        threads.add("pi", pi)
+        await threads.poll()
+        await threads.poll()
+
+        assert threads.generate_report() == {
+            "pi_thread_llvmpipe_cpu_time_microseconds": 550,
+            "pi_thread_mir_demo_server_cpu_time_microseconds": 150,
+            "pi_thread_count": 3,
+        }
+
+    def test_thread_group_names(self):
+        assert ThreadsBackend.thread_group("llvmpipe-12") == "llvmpipe"
+        assert ThreadsBackend.thread_group("Mir/Wayland") == "mir_wayland"
+        assert ThreadsBackend.thread_group("gdbus") == "gdbus"
+        assert ThreadsBackend.thread_group("42") == "unnamed"
+
+    async def test_raises_runtime_error_on_empty(self):
+        threads = ThreadsBackend()
+        threads.add("pi", Mock())
+
+        with pytest.raises(RuntimeError, match="Failed to collect thread data for pi"):
+            threads.generate_report()
+
+
+@pytest.mark.self
+class TestProcfs:
+    def test_parses_stat_with_odd_names(self):
+        name, fields = procfs.parse_stat("42 (a (weird) name) S 1 42 42 0 -1")
+        assert name == "a (weird) name"
+        assert fields == ["S", "1", "42", "42", "0", "-1"]
+
+    def test_reads_own_threads(self):
+        stats = procfs.read_thread_stats(os.getpid())
+        assert os.getpid() in stats
+        assert stats[os.getpid()].cpu_time_microseconds > 0
+
+    def test_reads_nothing_for_missing_process(self):
+        assert procfs.read_thread_stats(2**22 + 1) == {}
+        assert procfs.read_smaps_rollup(2**22 + 1) == {}
+        assert procfs.read_process_group_usage(2**22 + 1) is None
+
+    def test_reads_own_process_group(self):
+        usage = procfs.read_process_group_usage(os.getpgid(0))
+        assert usage is not None
+        cpu_time_microseconds, rss_bytes = usage
+        assert cpu_time_microseconds > 0
+        assert rss_bytes > 0
+
+    def test_reads_own_context_switches(self):
+        switches = {tid: counts for (tid, _), counts in procfs.read_context_switches(os.getpid()).items()}
+        assert os.getpid() in switches
+        assert switches[os.getpid()][0] > 0
+        assert procfs.read_context_switches(2**22 + 1) == {}
+
+    def test_reads_own_smaps_rollup(self):
+        smaps = procfs.read_smaps_rollup(os.getpid())
+        assert smaps["Rss"] >= smaps["Pss"] > 0
+        assert smaps["Rss"] % 1024 == 0
+
+
+@pytest.mark.self
+class TestResults:
+    PROPERTIES = [
+        ("server_mode", "1280x1024 60.0Hz"),
+        ("resolution", (1280, 1024)),
+        ("compositor_cpu_time_microseconds", 1000),
+        ("compositor_series_seconds", [0.0, 1.0, 2.0]),
+        ("compositor_series_mem_bytes", [10, 20, 30]),
+        ("client_series_mem_bytes", [5, 6]),
+    ]
+
+    def test_writes_json_and_csv(self, tmp_path) -> None:
+        path = results.write_result(tmp_path, "tests/test_a.py::test_b[server]", "passed", self.PROPERTIES)
+
+        assert path == tmp_path / "tests_test_a.py_test_b_server.json"
+        result = results.load_results(tmp_path)["tests/test_a.py::test_b[server]"]
+        assert result["outcome"] == "passed"
+        assert result["metadata"] == {"server_mode": "1280x1024 60.0Hz", "resolution": "(1280, 1024)"}
+        assert result["metrics"] == {"compositor_cpu_time_microseconds": 1000}
+        assert result["series"]["client_series_mem_bytes"] == [5, 6]
+        assert path.with_suffix(".csv").read_text().splitlines() == [
+            "compositor_series_seconds,compositor_series_mem_bytes,client_series_mem_bytes",
+            "0.0,10,5",
+            "1.0,20,6",
+            "2.0,30,",
+        ]
+
+    def test_compares_cumulative_series_by_increments(self) -> None:
+        assert results.series_samples("a_series_cpu_time_microseconds", [1, 3, 6]) == [2, 3]
+        assert results.series_samples("a_series_voluntary_context_switches", [1, 3, 6]) == [2, 3]
+        assert results.series_samples("a_series_oom_kill_events", [0, 0, 1]) == [0, 1]
+        assert results.series_samples("a_series_mem_bytes", [1, 3, 6]) == [1, 3, 6]
+
+    def test_longer_runs_compare_unchanged(self, tmp_path, capsys) -> None:
+        def run(samples: int) -> List[Tuple[str, object]]:
+            return [
+                (f"a_series_{key}", [sum(step + i % 3 for i in range(n)) for n in range(samples)])
+                for key, step in (
+                    ("cpu_time_microseconds", 1000),
+                    ("throttled_microseconds", 100),
+                    ("voluntary_context_switches", 50),
+                    ("max_events", 1),
+                )
+            ]
+
+        results.write_result(tmp_path / "short", "test", "passed", run(50))
+        results.write_result(tmp_path / "long", "test", "passed", run(500))
+
+        assert compare.main([str(tmp_path / "short"), str(tmp_path / "long")]) == 0
+        assert "changed" not in capsys.readouterr().out
+
+    def test_compare_flags_significant_regressions(self, tmp_path, capsys) -> None:
+        base = [("m", 100), ("a_series_mem_bytes", [100 + i % 5 for i in range(50)])]
+        same = [("m", 101), ("a_series_mem_bytes", [100 + i % 5 for i in range(50)])]
+        worse = [("m", 150), ("a_series_mem_bytes", [120 + i % 5 for i in range(50)])]
+        results.write_result(tmp_path / "base", "test", "passed", base)
+        results.write_result(tmp_path / "same", "test", "passed", same)
+        results.write_result(tmp_path / "worse", "test", "passed", worse)
+
+        assert compare.main([str(tmp_path / "base"), str(tmp_path / "same")]) == 0
+        assert compare.main([str(tmp_path / "base"), str(tmp_path / "worse")]) == 1
+        output = capsys.readouterr().out
+        assert "changed" in output
+        assert "REGRESSION" in output
+        assert "1 significant regression(s)" in output
+
+
+@pytest.mark.self
+class TestBaseline:
+    def write_baseline(self, path):
+        path.write_text("""
+tolerances:
+  "*_cpu_time_microseconds": 0.2
+  frame_count: {tolerance: 0.5, action: warn, direction: higher}
+  "*_ignored": {action: ignore}
+tests:
+  test:
+    a_cpu_time_microseconds: 1000
+    b_max_mem_bytes: 1000
+    frame_count: 100
+    a_ignored: 1
+    benchmarker_missed_ticks: 0
+""")
+        return Baseline(path)
+
+    def test_matches_tolerances(self, tmp_path) -> None:
+        baseline = self.write_baseline(tmp_path / "baseline.yaml")
+        assert baseline.tolerance("a_cpu_time_microseconds") == Tolerance(0.2)
+        assert baseline.tolerance("frame_count") == Tolerance(0.5, "warn", "higher")
+        assert baseline.tolerance("benchmarker_ticks").action == "ignore"
+        assert baseline.tolerance("anything") == Tolerance()
+
+    def test_finds_regressions(self, tmp_path) -> None:
+        baseline = self.write_baseline(tmp_path / "baseline.yaml")
+        properties = [
+            ("a_cpu_time_microseconds", 1150),
+            ("b_max_mem_bytes", 1150),
+            ("frame_count", 40),
+            ("a_ignored", 100),
+            ("benchmarker_missed_ticks", 3),
+            ("not_in_baseline", 5),
+            ("server_mode", "1280x1024"),
+        ]
+        regressions = baseline.check("test", properties)
+        assert [(r.key, r.tolerance.action) for r in regressions] == [
+            ("b_max_mem_bytes", "fail"),
+            ("frame_count", "warn"),
+        ]
+        assert str(regressions[0]) == (
+            "b_max_mem_bytes: 1150 vs baseline 1000 (+15.0%, tolerance 10%, lower is better)"
+        )
+        assert baseline.check("other test", properties) == []
+
+    def test_saves_and_reloads(self, tmp_path) -> None:
+        baseline = self.write_baseline(tmp_path / "baseline.yaml")
+        baseline.update("new test", [("a_cpu_time_microseconds", 5), ("server_mode", "1280x1024")])
+        baseline.save()
+
+        reloaded = Baseline(tmp_path / "baseline.yaml")
+        assert reloaded.tests["new test"] == {"a_cpu_time_microseconds": 5}
+        assert reloaded.tests["test"]["frame_count"] == 100
+        assert reloaded.tolerances == baseline.tolerances
+
+    def test_does_not_gate_on_run_statistics(self, tmp_path) -> None:
+        baseline = Baseline(tmp_path / "baseline.yaml")
+        runs: List[repeat.Properties] = [[("a_cpu_time_microseconds", 100)], [("a_cpu_time_microseconds", 102)]]
+        baseline.update("test", repeat.aggregate_runs(runs))
+        baseline.save()
+
+        reloaded = Baseline(tmp_path / "baseline.yaml")
+        assert reloaded.tests["test"] == {"a_cpu_time_microseconds": 101}
+        noisier: List[repeat.Properties] = [[("a_cpu_time_microseconds", 90)], [("a_cpu_time_microseconds", 112)]]
+        assert reloaded.check("test", repeat.aggregate_runs(noisier)) == []
+
+    def test_gate_fails_performance_tests(self, tmp_path) -> None:
+        item = MagicMock()
+        item.nodeid = "test"
+        item.user_properties = [("b_max_mem_bytes", 2000), ("frame_count", 10)]
+        item.config.getoption.return_value = False
+        warnings: List[str] = []
+        item.config.stash = {
+            pytest_plugin.BASELINE: self.write_baseline(tmp_path / "baseline.yaml"),
+            pytest_plugin.BASELINE_WARNINGS: warnings,
+        }
+        report = Mock(passed=True, outcome="passed")
+
+        pytest_plugin._check_baseline(item, report)
+
+        assert report.outcome == "failed"
+        assert "b_max_mem_bytes: 2000 vs baseline 1000" in report.longrepr
+        assert warnings == ["test: frame_count: 10 vs baseline 100 (-90.0%, tolerance 50%, higher is better)"]
+
+    def test_gate_saves_instead_of_checking(self, tmp_path) -> None:
+        item = MagicMock()
+        item.nodeid = "test"
+        item.user_properties = [("b_max_mem_bytes", 2000)]
+        item.config.getoption.return_value = True
+        baseline = self.write_baseline(tmp_path / "baseline.yaml")
+        item.config.stash = {pytest_plugin.BASELINE: baseline}
+        report = Mock(passed=True, outcome="passed")
+
+        pytest_plugin._check_baseline(item, report)
+
+        assert report.outcome == "passed"
+        assert baseline.tests["test"] == {"b_max_mem_bytes": 2000}
+
+
+@pytest.mark.self
+class TestLeakCheck:
+    PROPERTIES = [
+        ("compositor_mem_growth_bytes_per_second", 5000.0),
+        ("client_mem_growth_bytes_per_second", 10.0),
+        ("startup_compositor_mem_growth_bytes_per_second", 90000.0),
+        ("steady_compositor_mem_growth_bytes_per_second", 20.0),
+        ("steady_client_mem_growth_bytes_per_second", -3.0),
+        ("benchmarker_phase_startup_seconds", 1.0),
+        ("benchmarker_phase_steady_seconds", 3.0),
+    ]
+
+    @staticmethod
+    def check(properties, *args, **kwargs) -> Mock:
+        item = MagicMock()
+        item.user_properties = properties
+        item.get_closest_marker.return_value = pytest.mark.leak_check(*args, **kwargs).mark
+        report = Mock(passed=True, outcome="passed")
+        pytest_plugin._check_leaks(item, report)
+        return report
+
+    def test_checks_steady_phase(self) -> None:
+        assert self.check(self.PROPERTIES, max_bytes_per_s=100).outcome == "passed"
+        report = self.check(self.PROPERTIES, max_bytes_per_s=10)
+        assert report.outcome == "failed"
+        assert (
+            report.longrepr
+            == "Memory grew faster than 10 B/s:\n  steady_compositor_mem_growth_bytes_per_second: 20 B/s"
+        )
+
+    def test_checks_whole_run_without_phase(self) -> None:
+        report = self.check(self.PROPERTIES, max_bytes_per_s=1000, phase="idle")
+        assert report.outcome == "failed"
+        assert "compositor_mem_growth_bytes_per_second: 5000 B/s" in report.longrepr
+        assert "startup_" not in report.longrepr
+        assert self.check(self.PROPERTIES[:2], max_bytes_per_s=10000).outcome == "passed"
+
+    def test_takes_positional_arguments(self) -> None:
+        assert self.check(self.PROPERTIES, 100).outcome == "passed"
+        assert self.check(self.PROPERTIES, 10).outcome == "failed"
+        assert self.check(self.PROPERTIES, 1000, "idle").outcome == "failed"
+
+    def test_fails_without_threshold(self) -> None:
+        report = self.check(self.PROPERTIES, phase="steady")
+        assert report.outcome == "failed"
+        assert report.longrepr == "leak_check needs a max_bytes_per_s threshold"
+
+    def test_fails_without_numbers(self) -> None:
+        report = self.check([("frame_count", 10)], max_bytes_per_s=10)
+        assert report.outcome == "failed"
+        assert "No memory growth recorded" in report.longrepr
+
+
+@pytest.mark.self
+class TestRepeat:
+    def test_aggregates_numbers(self) -> None:
+        runs = [
+            [("cpu", 10), ("mode", "a"), ("series", [1, 2])],
+            [("cpu", 20), ("mode", "b"), ("series", [3, 4])],
+            [("cpu", 30), ("mode", "c"), ("series", [5, 6])],
+        ]
+        result = dict(repeat.aggregate_runs(runs))
+        assert result["cpu"] == 20
+        assert result["cpu_stddev"] == 10
+        assert result["cpu_cv"] == 0.5
+        assert result["cpu_ci95_low"] == pytest.approx(20 - 4.303 * 10 / 3**0.5)
+        assert result["cpu_ci95_high"] == pytest.approx(20 + 4.303 * 10 / 3**0.5)
+        assert result["cpu_runs"] == [10, 20, 30]
+        assert result["mode"] == "c"
+        assert result["series"] == [5, 6]
+
+    def test_keeps_numbers_missing_from_some_runs(self) -> None:
+        result = dict(repeat.aggregate_runs([[("a", 1)], [("a", 2), ("b", 3)]]))
+        assert result == {
+            "a": 1.5,
+            "a_stddev": ANY,
+            "a_cv": ANY,
+            "a_ci95_low": ANY,
+            "a_ci95_high": ANY,
+            "a_runs": [1, 2],
+            "b": 3,
+        }
+
+    def test_finds_unstable_metrics(self) -> None:
+        properties = repeat.aggregate_runs(
+            [
+                [("stable", 100), ("noisy", 10), ("benchmarker_ticks", 1)],
+                [("stable", 101), ("noisy", 20), ("benchmarker_ticks", 9)],
+            ]
+        )
+        assert repeat.unstable_metrics(properties, 0.1) == ["noisy (cv 47.1%)"]
+        assert repeat.unstable_metrics(properties, 0.1, ("stable",)) == []
+        assert repeat.unstable_metrics(properties, 0.5) == []
+
+    def test_renews_backends_between_runs(self) -> None:
+        hf = HighFrequencyCgroupsBackend()
+        hf.sample_cost.append(0.0, 1000)
+        backends: List[BenchmarkBackend] = [hf, PsiBackend()]
+        item = Mock(funcargs={"benchmark_backends": backends})
+
+        pytest_plugin._renew_backends(item)
+
+        assert item.funcargs["benchmark_backends"] is backends
+        assert [type(backend) for backend in backends] == [HighFrequencyCgroupsBackend, PsiBackend]
+        renewed = backends[0]
+        assert renewed is not hf and isinstance(renewed, HighFrequencyCgroupsBackend)
+        assert len(renewed.sample_cost.column("nanoseconds")) == 0
+
+
+class CountingBackend(BenchmarkBackend):
+    namespace = "counting"
+
+    def __init__(self) -> None:
+        self.samples = SampleBuffer(("count",), capacity=4)
+
+    def add(self, name: str, program) -> None:
+        pass
+
+    async def poll(self) -> None:
+        self.samples.append(time.monotonic(), len(self.samples) and self.samples.column("count")[-1] + 1)
+
+    def generate_report(self) -> Dict[str, object]:
+        return {"count": len(self.samples), "series_count": list(self.samples.column("count"))}
+
+    def sample_buffers(self) -> Dict[str, SampleBuffer]:
+        return {"program": self.samples}
+
+
+@pytest.mark.self
+class TestSoakRecorder:
+    async def test_streams_samples_and_checkpoints(self, tmp_path) -> None:
+        path = tmp_path / "soak.jsonl"
+        benchmarker = Benchmarker({"program": MagicMock()}, poll_time_seconds=0.05, backends=[CountingBackend()])
+        frame_stats = Mock(return_value={"frame_count": 3})
+        async with benchmarker, SoakRecorder(path, benchmarker, frame_stats, chunk_seconds=0.1, checkpoint_seconds=0.2):
+            await asyncio.sleep(1)
+
+        # Only 4 samples fit in memory, the log holds them all, in order and without duplicates
+        counts = load_samples(path, "counting", "program")["count"]
+        assert len(counts) > 10
+        assert counts == list(range(len(counts)))
+        assert len(load_samples(path, "benchmarker", "harness")["seconds"]) > 10
+
+        records = list(read_soak_log(path))
+        assert records[0]["type"] == "start" and records[0]["programs"] == ["program"]
+        assert sum(record["type"] == "checkpoint" for record in records) >= 3
+        assert {"type": "frames", "stats": {"frame_count": 3}}.items() <= records[-2].items()
+        report = load_checkpoint(path)
+        assert report is not None
+        assert report["counting_count"] == 4 and report["frame_count"] == 3
+        assert "counting_series_count" not in report
+
+    async def test_reserves_buffers_for_duration(self, tmp_path) -> None:
+        path = tmp_path / "soak.jsonl"
+        backend = CountingBackend()
+        benchmarker = Benchmarker({"program": MagicMock()}, poll_time_seconds=0.05, backends=[backend])
+        async with benchmarker, SoakRecorder(path, benchmarker, duration=1):
+            await asyncio.sleep(1)
+
+        # Way past the 4 samples the buffer started with, the report covers the whole run
+        counts = list(backend.samples.column("count"))
+        assert len(counts) > 10
+        assert counts == list(range(len(counts)))
+        report = load_checkpoint(path)
+        assert report is not None and report["counting_count"] == len(counts)
+
+    def test_reads_last_run_of_interrupted_log(self, tmp_path) -> None:
+        path = tmp_path / "soak.jsonl"
+        path.write_text(
+            '{"type": "start", "time": 1}\n'
+            '{"type": "checkpoint", "time": 2, "report": {"a": 1}}\n'
+            '{"type": "start", "time": 3}\n'
+            '{"type": "samples", "time": 4, "backend": "b", "name": "p", "seconds": [0], "columns": {"c": [1]}}\n'
+            '{"type": "checkpoint", "time": 5, "report": {"a": 2}}\n'
+            '{"type": "samples", "time": 6, "backend": "b", "name": "p", "seconds": [1], "col'
+        )
+        assert load_checkpoint(path) == {"a": 2}
+        assert load_samples(path, "b", "p") == {"seconds": [0], "c": [1]}
+
+
+@pytest.mark.self
+class TestSampleBuffer:
+    def test_keeps_samples_in_order(self) -> None:
+        buffer = SampleBuffer(("a", "b"), capacity=4)
+        for i in range(3):
+            buffer.append(i, i * 10, i * 100)
+
+        assert len(buffer) == 3
+        assert list(buffer.timestamps()) == [0, 1, 2]
+        assert list(buffer.column("b")) == [0, 100, 200]
+        assert buffer.last() == (2, 20, 200)
+
+    def test_overwrites_oldest_when_full(self) -> None:
+        buffer = SampleBuffer(("a",), capacity=3)
+        for i in range(5):
+            buffer.append(i, i)
+
+        assert len(buffer) == 3
+        assert list(buffer.timestamps()) == [2, 3, 4]
+        assert list(buffer.column("a")) == [2, 3, 4]
+
+    def test_can_select_window(self) -> None:
+        buffer = SampleBuffer(("a",), capacity=3)
+        for i in range(5):
+            buffer.append(i, i)
+
+        assert list(buffer.column("a", start=3)) == [3, 4]
+        assert list(buffer.column("a", end=3)) == [2]
+        assert list(buffer.column("a", start=2.5, end=3.5)) == [3]
+
+    def test_reserve_keeps_wrapped_samples(self) -> None:
+        buffer = SampleBuffer(("a",), capacity=3)
+        for i in range(5):
+            buffer.append(i, i)
+        buffer.reserve(6)
+        for i in range(5, 10):
+            buffer.append(i, i)
+
+        assert buffer.capacity == 6
+        assert list(buffer.timestamps()) == [4, 5, 6, 7, 8, 9]
+        assert list(buffer.column("a")) == [4, 5, 6, 7, 8, 9]
+        buffer.reserve(2)
+        assert buffer.capacity == 6
+
+    def test_last_of_empty_is_none(self) -> None:
+        assert SampleBuffer(("a",)).last() is None
+
+
+@pytest.mark.self
+class TestStats:
+    def test_percentile_interpolates(self) -> None:
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([4, 1, 3, 2], 0) == 1
+        assert percentile([4, 1, 3, 2], 100) == 4
+
+    def test_rates_skip_empty_intervals(self) -> None:
+        assert rates([0, 1, 1, 3], [0, 10, 20, 40]) == [10, 10]
+
+    def test_confidence_interval(self) -> None:
+        assert confidence_interval_95([5]) == (5, 5)
+        low, high = confidence_interval_95([1, 3])
+        assert (low, high) == pytest.approx((2 - 12.706, 2 + 12.706))
+        low, high = confidence_interval_95([0, 2] * 50)
+        assert (low, high) == pytest.approx((1 - 1.96 * (100 / 99) ** 0.5 / 10, 1 + 1.96 * (100 / 99) ** 0.5 / 10))
+
+    def test_theil_sen_slope(self) -> None:
+        xs = list(range(20))
+        ys = [1000 + 5 * x for x in xs]
+        assert theil_sen_slope(xs, ys) == 5
+        ys[3] = ys[7] = 10**6
+        ys[12] = -(10**6)
+        assert theil_sen_slope(xs, ys) == 5
+        assert theil_sen_slope(list(range(5000)), [2 * x for x in range(5000)]) == 2
+        with pytest.raises(AssertionError, match="fewer than two points"):
+            theil_sen_slope([1, 1], [2, 3])
+
+    def test_mann_whitney_u(self) -> None:
+        assert mann_whitney_u([1, 2, 3] * 10, [1, 2, 3] * 10) == 1.0
+        assert mann_whitney_u([1] * 5, [1] * 5) == 1.0
+        assert mann_whitney_u(range(20), range(20, 40)) < 0.001
+        assert 0.1 < mann_whitney_u(range(1, 9), range(3, 11)) < 0.2
+
+
 @pytest.mark.self
 class TestCgroup:
     @patch(
@@ -277,6 +1556,22 @@ class TestCgroup:
         with pytest.raises(RuntimeError, match="Unable to get the cpu time for cgroup: /fake/path"):
             cgroup.get_cpu_time_microseconds()
 
+    @patch("builtins.open", new_callable=mock_open, read_data="usage_usec 100\nnr_throttled 3\nthrottled_usec 4\n")
+    def test_cgroup_can_get_cpu_stat(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        assert cgroup.get_cpu_stat() == {"usage_usec": 100, "nr_throttled": 3, "throttled_usec": 4}
+
+    @patch("builtins.open", new_callable=mock_open, read_data="anon 4096\nfile 8192\nshmem 0\n")
+    def test_cgroup_can_get_memory_stat(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        assert cgroup.get_memory_stat() == {"anon": 4096, "file": 8192, "shmem": 0}
+
+    @patch("builtins.open", new_callable=mock_open, read_data="low 0\nhigh\n")
+    def test_cgroup_get_memory_events_raises_when_malformed(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        with pytest.raises(RuntimeError, match="Unable to get the memory.events for cgroup: /fake/path"):
+            cgroup.get_memory_events()
+
     @patch("builtins.open", new_callable=mock_open, read_data="100")
     def test_cgroup_can_get_current_memory(self, mock_open):
         cgroup = Cgroup("/fake/path")
@@ -299,6 +1594,29 @@ class TestCgroup:
         with pytest.raises(RuntimeError, match="Unable to get the peak memory for cgroup: /fake/path"):
             cgroup.get_peak_memory()
 
+    @patch(
+        "builtins.open",
+        new_callable=mock_open,
+        read_data="some avg10=1.50 avg60=0.25 avg300=0.00 total=1234\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=12",
+    )
+    def test_cgroup_can_get_pressure(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        pressure = cgroup.get_pressure("cpu")
+        mock_open.assert_called_once_with("/fake/path/cpu.pressure", "r")
+        assert pressure["some"] == {"avg10": 1.5, "avg60": 0.25, "avg300": 0.0, "total": 1234}
+        assert pressure["full"]["total"] == 12
+
+    @patch("builtins.open", new_callable=mock_open, read_data="12\n34\n")
+    def test_cgroup_can_get_pids(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        assert cgroup.get_pids() == [12, 34]
+
+    @patch("builtins.open", new_callable=mock_open, read_data="string")
+    def test_cgroup_get_pressure_raises_when_malformed(self, mock_open):
+        cgroup = Cgroup("/fake/path")
+        with pytest.raises(RuntimeError, match="Unable to get the io pressure for cgroup: /fake/path"):
+            cgroup.get_pressure("io")
+
     @patch("builtins.open", new_callable=mock_open, read_data="string")
     async def test_cgroup_path_raises_assertion_error_when_contents_are_incorrect(self, mock_open):
         with pytest.raises(AssertionError, match=f"Line in cgroup file does not start with 0:: for pid: {os.getpid()}"):
@@ -331,6 +1649,365 @@ class TestDisplayServer:
 
         mock_fixture.assert_has_calls([call("server_mode", "123x456 78.9Hz"), call("server_renderer", "Mock renderer")])
 
+    @patch("mir_ci.program.display_server.os.readlink")
+    def test_display_server_records_snap_revision(self, mock_readlink) -> None:
+        mock_fixture = Mock()
+        mock_readlink.return_value = "1234"
+        server = DisplayServer(App(["foo.bar"], AppType.snap))
+
+        class MockServer:
+            name = "foo.bar"
+            output = ""
+
+        with patch.object(server, "server", MockServer()):
+            server.record_properties(mock_fixture)
+
+        mock_readlink.assert_called_once_with("/snap/foo/current")
+        mock_fixture.assert_called_once_with("server_snap_revision", "1234")
+
+    def test_display_server_records_startup_timings(self) -> None:
+        mock_fixture = Mock()
+        server = DisplayServer(App("foo"))
+        server.startup_timings = {"socket": 0.12345, "registry": 0.2, "first_frame": 0.5}
+
+        class MockServer:
+            output = ""
+
+        with patch.object(server, "server", MockServer()):
+            server.record_properties(mock_fixture)
+
+        mock_fixture.assert_has_calls(
+            [
+                call("server_startup_socket_seconds", 0.1235),
+                call("server_startup_registry_seconds", 0.2),
+                call("server_startup_first_frame_seconds", 0.5),
+            ]
+        )
+
+
+@pytest.mark.self
+class TestScreencopyTracker:
+    @staticmethod
+    def ready(tracker: ScreencopyTracker, seconds: float) -> None:
+        tracker._frame_ready(tracker.frame, 0, int(seconds), round(seconds % 1 * 10**9))
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_reports_frame_pacing(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name")
+        tracker.display = Mock()
+        tracker.screencopy_manager = tracker.buffer = tracker.frame = MagicMock()
+        tracker._output_mode(None, WlOutput.mode.preferred, 1920, 1080, 30000)
+        tracker._output_mode(None, WlOutput.mode.current, 1920, 1080, 50000)
+        # Every 20ms, but for one refresh without a frame
+        for seconds in (100.0, 100.02, 100.04, 100.08, 100.1):
+            self.ready(tracker, seconds)
+
+        properties = tracker.properties()
+        assert properties["frame_count"] == 5
+        assert properties["refresh_rate_hz"] == 50
+        assert properties["missed_frames"] == 1
+        assert properties["frame_interval_p50_ms"] == pytest.approx(20)
+        assert properties["frame_interval_max_ms"] == pytest.approx(40)
+        assert properties["frame_jitter_ms"] == pytest.approx(8.66, abs=0.01)
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_reports_damage(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name")
+        tracker.display = Mock()
+        tracker.screencopy_manager = tracker.buffer = tracker.frame = MagicMock()
+        tracker.buffer_width, tracker.buffer_height = 100, 10
+        # Full damage, then overlapping rects, then a single rect
+        self.ready(tracker, 1)
+        tracker._frame_damage(tracker.frame, 0, 0, 10, 10)
+        tracker._frame_damage(tracker.frame, 5, 0, 10, 10)
+        self.ready(tracker, 2)
+        tracker._frame_damage(tracker.frame, 50, 5, 2, 2)
+        self.ready(tracker, 3)
+
+        properties = tracker.properties()
+        assert properties["total_damage"] == 1000 + 150 + 4
+        assert properties["percent_damage"] == pytest.approx(1154 / 3000 * 100)
+        assert properties["damage_rects_max"] == 2
+        assert properties["damage_rects_p50"] == 1
+        assert properties["damage_rects_p95"] == 1.9
+        assert properties["damage_overlap_ratio"] == round(1204 / 1154, 3)
+        assert tracker.damage.rects(2).tolist() == [[0, 0, 10, 10], [5, 0, 10, 10]]
+        assert tracker.damage.heatmap_frames == 3
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_exposes_frame_without_copying(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name")
+        # Two rows of two BGRA pixels, padded to a stride of 12 bytes
+        tracker.shm_data = mmap.mmap(-1, 24)
+        tracker.shm_data[:] = bytes((1, 2, 3, 4, 5, 6, 7, 8, 0, 0, 0, 0, 9, 10, 11, 12, 13, 14, 15, 16, 0, 0, 0, 0))
+        tracker.frame_count = 1
+        tracker.buffer_width, tracker.buffer_height, tracker.buffer_stride, tracker.buffer_size = 2, 2, 12, 24
+        tracker.buffer_format = WlShm.format.argb8888
+
+        pixels = tracker.pixels()
+        assert pixels.tolist() == [[[1, 2, 3, 4], [5, 6, 7, 8]], [[9, 10, 11, 12], [13, 14, 15, 16]]]
+        assert not pixels.flags.writeable
+        tracker.shm_data[0] = 100
+        assert pixels[0, 0, 0] == 100
+
+        assert tracker.pixels(rgba=True).tolist() == [
+            [[3, 2, 100, 4], [7, 6, 5, 8]],
+            [[11, 10, 9, 12], [15, 14, 13, 16]],
+        ]
+        tracker.frame_flags = ScreencopyTracker.FRAME_FLAGS.y_invert
+        assert tracker.pixels()[0].tolist() == [[9, 10, 11, 12], [13, 14, 15, 16]]
+
+        # The mapping outlives the tracker's use of it while frames are around
+        tracker.disconnected()
+        assert pixels[1, 1, 3] == 16
+
+    @staticmethod
+    def pooled_tracker(buffers: int, manager: MagicMock, shm: MagicMock) -> ScreencopyTracker:
+        tracker = ScreencopyTracker("test-display-name", buffers=buffers)
+        tracker.display = Mock()
+        tracker.screencopy_manager = manager
+        tracker.frame = MagicMock()
+        tracker.shm = shm
+        shm.create_pool.return_value.create_buffer.side_effect = lambda offset, *args: offset
+        tracker.display.roundtrip.side_effect = lambda: tracker._frame_buffer(
+            tracker.frame, WlShm.format.argb8888, 2, 1, 8
+        )
+        tracker.connected()
+        return tracker
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_rotates_through_buffer_pool(self, mock_init) -> None:
+        shm = MagicMock()
+        tracker = self.pooled_tracker(3, MagicMock(), shm)
+        shm.create_pool.assert_called_once_with(ANY, 24)
+        assert tracker.buffers == [0, 8, 16]
+        captured = [tracker.buffer]
+        for seconds in range(4):
+            self.ready(tracker, seconds)
+            captured.append(tracker.buffer)
+        assert captured == [0, 8, 16, 0, 8]
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_leased_frames_are_not_overwritten(self, mock_init) -> None:
+        manager = MagicMock()
+        tracker = self.pooled_tracker(2, manager, MagicMock())
+        assert tracker.shm_data is not None
+        tracker.shm_data[:8] = bytes(range(8))
+        self.ready(tracker, 0)
+        with tracker.lease() as frame:
+            assert frame.number == 1
+            # Capture goes on into the other buffer only
+            for seconds in range(1, 4):
+                self.ready(tracker, seconds)
+                assert tracker.buffer == 8
+            assert frame.pixels(rgba=True).tolist() == [[[2, 1, 0, 3], [6, 5, 4, 7]]]
+
+            # Once both are leased, capture waits for a release
+            tracker.shm_data[8:] = bytes(range(8, 16))
+            second = tracker.lease()
+            assert second.pixels()[0, 0].tolist() == [8, 9, 10, 11]
+            calls = manager.capture_output.call_count
+            self.ready(tracker, 4)
+            assert tracker.capture_deferred
+            assert manager.capture_output.call_count == calls
+        assert not tracker.capture_deferred
+        assert tracker.buffer == 0
+        assert manager.capture_output.call_count == calls + 1
+        second.release()
+        assert tracker.leases == [0, 0]
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    async def test_streams_latest_frames(self, mock_init) -> None:
+        tracker = self.pooled_tracker(1, MagicMock(), MagicMock())
+        frames = tracker.frames()
+        waiting = asyncio.ensure_future(frames.__anext__())
+        await asyncio.sleep(0)
+        assert len(tracker.streams) == 1
+        tracker._frame_damage(tracker.frame, 0, 0, 1, 1)
+        self.ready(tracker, 10)
+        frame = await waiting
+        assert (frame.number, frame.timestamp, frame.damage.tolist()) == (1, 10, [[0, 0, 1, 1]])
+
+        for seconds in range(11, 14):
+            self.ready(tracker, seconds)
+        assert (await frames.__anext__()).number == 4
+        assert tracker.streams[0].dropped == 2
+        await frames.aclose()
+        assert not tracker.streams
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    async def test_lossless_stream_holds_capture_back(self, mock_init) -> None:
+        manager = MagicMock()
+        tracker = self.pooled_tracker(2, manager, MagicMock())
+        self.ready(tracker, 0)
+        frames = tracker.frames(maxsize=2, lossless=True, include_last=True)
+        assert (await frames.__anext__()).number == 1
+
+        self.ready(tracker, 1)
+        self.ready(tracker, 2)
+        assert tracker.capture_deferred
+        calls = manager.capture_output.call_count
+        assert [(await frames.__anext__()).number for _ in range(2)] == [2, 3]
+        assert not tracker.capture_deferred
+        assert manager.capture_output.call_count == calls + 1
+        await frames.aclose()
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    async def test_waits_for_next_frame(self, mock_init) -> None:
+        tracker = self.pooled_tracker(1, MagicMock(), MagicMock())
+        waiting = asyncio.ensure_future(tracker.next_frame())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        self.ready(tracker, 1)
+        assert (await waiting).number == 1
+        assert not tracker.streams
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_counts_redundant_frames(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name", hash_frames=True)
+        tracker.display = Mock()
+        tracker.screencopy_manager = tracker.frame = MagicMock()
+        tracker.shm = MagicMock()
+        tracker.display.roundtrip.side_effect = lambda: tracker._frame_buffer(
+            tracker.frame, WlShm.format.xrgb8888, 2, 1, 8
+        )
+        tracker.connected()
+        assert tracker.shm_data is not None
+        self.ready(tracker, 0)
+        tracker._frame_damage(tracker.frame, 0, 0, 2, 1)
+        self.ready(tracker, 1)
+        assert tracker.last_frame is not None and tracker.last_frame.redundant
+        tracker.shm_data[0] = 1
+        self.ready(tracker, 2)
+        self.ready(tracker, 4)
+
+        properties = tracker.properties()
+        assert properties["redundant_frames"] == 2
+        assert properties["redundant_frames_per_second"] == 0.5
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_skips_hashing_unsupported_formats(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name", hash_frames=True)
+        tracker.display = Mock()
+        tracker.screencopy_manager = tracker.frame = MagicMock()
+        tracker.shm = MagicMock()
+        tracker.display.roundtrip.side_effect = lambda: tracker._frame_buffer(
+            tracker.frame, WlShm.format.rgb565, 2, 1, 4
+        )
+        tracker.connected()
+        self.ready(tracker, 0)
+        self.ready(tracker, 1)
+
+        assert tracker.last_frame is not None and not tracker.last_frame.redundant
+        properties = tracker.properties()
+        assert properties["redundant_frames_unsupported_format"] == f"{WlShm.format.rgb565:#x}"
+        assert "redundant_frames" not in properties
+        tracker.disconnected()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_reports_no_pacing_without_refresh_rate(self, mock_init) -> None:
+        tracker = ScreencopyTracker("test-display-name")
+        tracker.display = Mock()
+        tracker.screencopy_manager = tracker.buffer = tracker.frame = MagicMock()
+        self.ready(tracker, 1)
+        assert "frame_interval_p50_ms" not in tracker.properties()
+        self.ready(tracker, 2)
+        assert tracker.properties()["frame_interval_p50_ms"] == 1000
+        assert "missed_frames" not in tracker.properties()
+
+
+@pytest.mark.self
+class TestDamage:
+    def test_union_area_counts_overlaps_once(self) -> None:
+        assert union_area(np.zeros((0, 4), dtype=np.int32)) == 0
+        assert union_area(np.array([(0, 0, 10, 10)])) == 100
+        assert union_area(np.array([(0, 0, 10, 10), (5, 5, 10, 10)])) == 175
+        assert union_area(np.array([(0, 0, 10, 10), (2, 2, 2, 2)])) == 100
+        assert union_area(np.array([(0, 0, 10, 10), (20, 0, 10, 10)])) == 200
+
+    def test_keeps_rects_of_recent_frames(self) -> None:
+        damage = DamageLog(capacity=3)
+        damage.add_frame(1, np.array([(0, 0, 1, 1), (1, 1, 1, 1)]), 0, 0)
+        damage.add_frame(2, np.array([(2, 2, 1, 1), (3, 3, 1, 1)]), 0, 0)
+        assert damage.rects(1).tolist() == [[1, 1, 1, 1]]
+        assert damage.rects(2).tolist() == [[2, 2, 1, 1], [3, 3, 1, 1]]
+        assert len(damage.rects(3)) == 0
+
+    def test_writes_heatmap(self, tmp_path) -> None:
+        damage = DamageLog(cell=8)
+        damage.add_frame(1, np.array([(0, 0, 32, 16)]), 32, 16)
+        damage.add_frame(2, np.array([(0, 0, 4, 4), (9, 0, 1, 1)]), 32, 16)
+        assert damage.heatmap.tolist() == [[2, 2, 1, 1], [1, 1, 1, 1]]
+
+        path = tmp_path / "heatmap.png"
+        damage.write_heatmap(path)
+        data = path.read_bytes()
+        assert data.startswith(b"\x89PNG\r\n\x1a\n")
+        pixels = data.index(b"IDAT") + 4
+        assert list(zlib.decompressobj().decompress(data[pixels:])) == [
+            0,
+            255,
+            255,
+            127,
+            127,
+            0,
+            127,
+            127,
+            127,
+            127,
+        ]
+
+
+@pytest.mark.self
+class TestFrameHasher:
+    def test_detects_changed_pixels_in_damage(self) -> None:
+        hasher = FrameHasher(tile=4)
+        pixels = np.zeros((6, 10), dtype=np.uint32)
+        assert hasher.update(pixels, np.array([(0, 0, 1, 1)]))
+        assert hasher.hashes is not None and hasher.hashes.shape == (2, 3)
+
+        # Damaged, but unchanged
+        assert not hasher.update(pixels, np.array([(0, 0, 10, 6)]))
+        pixels[5, 9] = 1
+        assert hasher.update(pixels, np.array([(8, 4, 2, 2)]))
+        assert not hasher.update(pixels, np.array([(8, 4, 2, 2)]))
+        # Only damaged blocks are hashed again
+        pixels[0, 0] = 1
+        assert not hasher.update(pixels, np.array([(4, 0, 4, 4)]))
+        assert hasher.update(pixels, np.array([(0, 0, 1, 1)]))
+        # Pixels swapped within a block change its hash
+        pixels[0, 0], pixels[0, 1] = 0, 1
+        assert hasher.update(pixels, np.array([(0, 0, 2, 1), (100, 100, 1, 1)]))
+
+
+@pytest.mark.self
+class TestStartupProbe:
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_times_registry_without_screencopy(self, mock_init) -> None:
+        probe = StartupProbe("test-display-name")
+        probe.connected()
+        assert probe.registry_time is not None
+        assert not probe.can_capture
+        assert not probe.first_frame.is_set()
+
+    @patch("mir_ci.wayland.screencopy_tracker.WaylandClient.__init__")
+    def test_times_first_frame(self, mock_init) -> None:
+        probe = StartupProbe("test-display-name")
+        probe.display = Mock()
+        probe.screencopy_manager = probe.buffer = probe.frame = MagicMock()
+        probe._frame_ready(probe.frame, 0, 0, 0)
+        first_frame_time = probe.first_frame_time
+        probe._frame_ready(probe.frame, 0, 0, 0)
+        assert probe.first_frame.is_set()
+        assert probe.first_frame_time == first_frame_time
+        assert probe.frame_count == 2
+
 
 @pytest.mark.self
 class TestOutputWatcher:
@@ -0,0 +1,155 @@
+import pathlib
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+
+def union_area(rects: np.ndarray) -> int:
+    """
+    The area covered by `rects`, an (N, 4) array of `x, y, width, height` rows, counting
+    overlaps once. The plane is split along every rectangle edge and the cells covered by
+    any rectangle are summed up.
+    """
+    if not len(rects):
+        return 0
+    x0, y0 = rects[:, 0], rects[:, 1]
+    x1, y1 = x0 + rects[:, 2], y0 + rects[:, 3]
+    xs = np.unique(np.concatenate((x0, x1)))
+    ys = np.unique(np.concatenate((y0, y1)))
+    covered = np.zeros((len(ys) - 1, len(xs) - 1), dtype=bool)
+    columns = zip(np.searchsorted(xs, x0), np.searchsorted(xs, x1))
+    rows = zip(np.searchsorted(ys, y0), np.searchsorted(ys, y1))
+    for (left, right), (top, bottom) in zip(columns, rows):
+        covered[top:bottom, left:right] = True
+    return int(np.outer(np.diff(ys), np.diff(xs))[covered].sum())
+
+
+def write_png(path: pathlib.Path, image: np.ndarray) -> None:
+    """
+    Write a 2D `uint8` array as a grayscale PNG.
+    """
+    height, width = image.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    # Every scanline starts with its filter type, 0 for none
+    scanlines = np.hstack((np.zeros((height, 1), dtype=np.uint8), image)).tobytes()
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(scanlines)))
+        f.write(chunk(b"IEND", b""))
+
+
+class DamageLog:
+    """
+    The damage rectangles of the most recent frames, `capacity` rectangles at most, along
+    with a heatmap of how many frames damaged each `cell`×`cell` pixel block of the output.
+    """
+
+    def __init__(self, capacity: int = 2**16, cell: int = 8) -> None:
+        self.capacity = capacity
+        self.cell = cell
+        self._rects = np.zeros((capacity, 4), dtype=np.int32)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._head = 0
+        self._size = 0
+        self.heatmap = np.zeros((0, 0), dtype=np.uint32)
+        self.heatmap_frames = 0
+
+    def add_frame(self, frame: int, rects: np.ndarray, width: int, height: int) -> int:
+        """
+        Keep the damage `rects` of `frame` on a `width`×`height` output and return the area
+        they cover.
+        """
+        indices = (self._head + np.arange(len(rects))) % self.capacity
+        self._rects[indices] = rects
+        self._frames[indices] = frame
+        self._head = (self._head + len(rects)) % self.capacity
+        self._size = min(self._size + len(rects), self.capacity)
+
+        if width and height:
+            shape = (-(-height // self.cell), -(-width // self.cell))
+            if self.heatmap.shape != shape:
+                self.heatmap = np.zeros(shape, dtype=np.uint32)
+                self.heatmap_frames = 0
+            damaged = np.zeros(shape, dtype=bool)
+            for x, y, w, h in rects:
+                cells_x = slice(x // self.cell, -(-(x + w) // self.cell))
+                cells_y = slice(y // self.cell, -(-(y + h) // self.cell))
+                damaged[cells_y, cells_x] = True
+            self.heatmap += damaged
+            self.heatmap_frames += 1
+        return union_area(rects)
+
+    def rects(self, frame: int) -> np.ndarray:
+        """
+        The damage rectangles of `frame`, as `x, y, width, height` rows, empty once they were
+        overwritten.
+        """
+        indices = (self._head - self._size + np.arange(self._size)) % self.capacity
+        rects: np.ndarray = self._rects[indices[self._frames[indices] == frame]]
+        return rects
+
+    def write_heatmap(self, path: pathlib.Path) -> None:
+        """
+        Write the heatmap as a grayscale PNG, white for the blocks damaged by every frame.
+        """
+        scale = 255 / max(self.heatmap_frames, 1)
+        write_png(path, (self.heatmap * scale).astype(np.uint8))
+
+
+class FrameHasher:
+    """
+    Hashes frames in `tile`×`tile` pixel blocks to tell whether a frame changed any pixels.
+    Only the blocks touched by the frame's damage are hashed again.
+
+    A block's hash is the sum of its pixels, each multiplied by a random odd weight picked
+    by its position in the block, wrapping around at 64 bits. Any single pixel changing
+    changes the hash, and it's computed for all damaged blocks in a few NumPy operations.
+    """
+
+    def __init__(self, tile: int = 32, seed: int = 0) -> None:
+        self.tile = tile
+        rng = np.random.default_rng(seed)
+        self._row_weights = rng.integers(0, 2**63, size=tile, dtype=np.uint64) | np.uint64(1)
+        self._column_weights = rng.integers(0, 2**63, size=tile, dtype=np.uint64) | np.uint64(1)
+        self.hashes: Optional[np.ndarray] = None
+
+    def _hash(self, pixels: np.ndarray, top: int, bottom: int, left: int, right: int) -> np.ndarray:
+        block = pixels[top:bottom, left:right].astype(np.uint64)
+        block *= self._column_weights[np.arange(left, right) % self.tile]
+        block *= self._row_weights[np.arange(top, bottom) % self.tile, np.newaxis]
+        rows = np.add.reduceat(block, np.arange(0, bottom - top, self.tile), axis=0)
+        return np.add.reduceat(rows, np.arange(0, right - left, self.tile), axis=1)
+
+    def update(self, pixels: np.ndarray, rects: np.ndarray) -> bool:
+        """
+        Hash the blocks of `pixels`, a `(height, width)` array of 32-bit pixels, touched by
+        `rects`, and return whether any of them changed. The first frame hashed, or one of
+        a different size, always counts as changed.
+        """
+        height, width = pixels.shape
+        shape = (-(-height // self.tile), -(-width // self.tile))
+        if self.hashes is None or self.hashes.shape != shape:
+            self.hashes = self._hash(pixels, 0, height, 0, width)
+            return True
+        changed = False
+        for x, y, w, h in rects:
+            tiles_x = slice(max(x, 0) // self.tile, -(-min(x + w, width) // self.tile))
+            tiles_y = slice(max(y, 0) // self.tile, -(-min(y + h, height) // self.tile))
+            if tiles_x.start >= tiles_x.stop or tiles_y.start >= tiles_y.stop:
+                continue
+            hashes = self._hash(
+                pixels,
+                tiles_y.start * self.tile,
+                min(tiles_y.stop * self.tile, height),
+                tiles_x.start * self.tile,
+                min(tiles_x.stop * self.tile, width),
+            )
+            changed = changed or bool((hashes != self.hashes[tiles_y, tiles_x]).any())
+            self.hashes[tiles_y, tiles_x] = hashes
+        return changed
@@ -1,10 +1,16 @@
 import asyncio
-import ctypes
 import mmap
 import os
-import stat
-from typing import Any, Dict, Optional
+import pathlib
+from collections import deque
+from contextlib import suppress
+from typing import Any, AsyncGenerator, Deque, Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
+from mir_ci.lib.samples import SampleBuffer
+from mir_ci.lib.stats import percentile
+
+from .damage import DamageLog, FrameHasher
 from .protocols import WlOutput, WlShm, ZwlrScreencopyFrameV1, ZwlrScreencopyManagerV1
 from .protocols.wayland.wl_buffer import WlBufferProxy
 from .protocols.wayland.wl_output import WlOutputProxy
@@ -13,36 +19,142 @@ from .protocols.wlr_screencopy_unstable_v1.zwlr_screencopy_frame_v1 import ZwlrS
 from .protocols.wlr_screencopy_unstable_v1.zwlr_screencopy_manager_v1 import ZwlrScreencopyManagerV1Proxy
 from .wayland_client import WaylandClient
 
-libc = ctypes.cdll.LoadLibrary(None)  # type: ignore
-shm_counter = 0
 
+class FrameInfo(NamedTuple):
+    """
+    A frame captured by `ScreencopyTracker`, as streamed by `ScreencopyTracker.frames`.
+    `damage` holds its damage rectangles as `x, y, width, height` rows. `redundant` frames
+    didn't change any pixels, only known when hashing frames.
+    """
+
+    number: int
+    timestamp: float
+    flags: int
+    damage: np.ndarray
+    redundant: bool = False
+
+
+class FrameStream:
+    """
+    The frames captured since a consumer subscribed with `ScreencopyTracker.frames`, up to
+    `maxsize` of them. When full, a lossless stream holds capture back until the consumer
+    catches up, others drop their oldest frame.
+    """
+
+    def __init__(self, maxsize: int, lossless: bool) -> None:
+        assert maxsize > 0, "Frame streams need room for a frame"
+        self.maxsize = maxsize
+        self.lossless = lossless
+        self.queue: Deque[FrameInfo] = deque()
+        self.event = asyncio.Event()
+        self.dropped = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self.queue) >= self.maxsize
+
+    def put(self, frame: FrameInfo) -> None:
+        if self.full and not self.lossless:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(frame)
+        self.event.set()
+
+
+class FrameLease:
+    """
+    A frame captured by `ScreencopyTracker`, whose buffer isn't captured into again until
+    the lease is released, see `ScreencopyTracker.lease`. Use it as a context manager, or
+    call `release`.
+    """
+
+    def __init__(self, tracker: "ScreencopyTracker", index: int, number: int, flags: int) -> None:
+        self.tracker = tracker
+        self.index = index
+        self.number = number
+        self.flags = flags
+        self.released = False
 
-def shm_open() -> int:
-    global shm_counter
-    shm_counter += 1
-    name = f"/frame-test-{os.getpid()}-{shm_counter}"
-    c_name = name.encode("utf-8")
-    oflag = ctypes.c_int(os.O_RDWR | os.O_CREAT | os.O_EXCL)
-    mode = ctypes.c_ushort(stat.S_IRUSR | stat.S_IWUSR)
-    open_result: int = libc.shm_open(c_name, oflag, mode)
-    assert open_result >= 0, f"Error {open_result} opening SHM file {name}: {os.strerror(ctypes.get_errno())}"
-    unlink_result = libc.shm_unlink(c_name)
-    assert unlink_result >= 0, f"Error {unlink_result} unlinking SHM file {name}: {os.strerror(ctypes.get_errno())}"
-    return open_result
+    def pixels(self, rgba: bool = False) -> np.ndarray:
+        """
+        The frame, as `ScreencopyTracker.pixels` would have returned it when leased. Views
+        must not be used past the release.
+        """
+        assert not self.released, "Frame lease already released"
+        return self.tracker._buffer_pixels(self.index, self.flags, rgba)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.tracker._release(self.index)
+
+    def __enter__(self) -> "FrameLease":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
 
 
 class ScreencopyTracker(WaylandClient):
+    """
+    Captures every frame of the first output and keeps count of the frames and their damage.
+
+    The presentation timestamp of the last `frame_capacity` frames is kept too, to report
+    on frame pacing: percentiles of the interval between frames, its jitter (standard
+    deviation) and, given the output's refresh rate, how many refreshes went by without a
+    frame. A compositor only produces frames when something changed, so missed frames are
+    only meaningful while the content changes on every refresh, e.g. during an animation.
+
+    Damage is counted as the area the damage rectangles of each frame cover, overlaps
+    once, with a frame without damage counting as damaged all over. How fragmented the
+    damage is (rectangles per frame, and how much they overlap) is reported, and the
+    rectangles themselves are kept in `damage`, along with a heatmap of where the output
+    was damaged, see `DamageLog`.
+
+    Frames are captured into a pool of `buffers` shared memory buffers in turn. With more
+    than one, a frame can be leased (see `lease`) and analysed while capture carries on into
+    the other buffers.
+
+    Consumers waiting for frames can subscribe to them with `frames` or `next_frame`.
+
+    With `hash_frames`, the damaged regions of every frame are hashed to count the redundant
+    frames: those the compositor produced without changing a single pixel, see `FrameHasher`.
+    Only the 8-bit RGB formats of `RGBA_CHANNELS` are hashed, for any other the properties
+    say `redundant_frames_unsupported_format` instead.
+    """
+
     required_extensions = (ZwlrScreencopyManagerV1.name,)
     FRAME_FLAGS = ZwlrScreencopyFrameV1.flags
+    # Byte order of the 32-bit little-endian formats, as indices of R, G, B and A
+    RGBA_CHANNELS: Dict[int, Tuple[int, ...]] = {
+        WlShm.format.argb8888: (2, 1, 0, 3),
+        WlShm.format.xrgb8888: (2, 1, 0, 3),
+        WlShm.format.abgr8888: (0, 1, 2, 3),
+        WlShm.format.xbgr8888: (0, 1, 2, 3),
+    }
+    PERCENTILES = (50, 95, 99)
 
-    def __init__(self, display_name: str) -> None:
+    def __init__(
+        self, display_name: str, frame_capacity: int = 2**16, buffers: int = 1, hash_frames: bool = False
+    ) -> None:
         super().__init__(display_name)
+        assert buffers > 0, "At least one buffer needed"
         self.screencopy_manager: Optional[ZwlrScreencopyManagerV1Proxy] = None
         self.output: Optional[WlOutputProxy] = None
         self.shm: Optional[WlShmProxy] = None
         self.frame: Optional[ZwlrScreencopyFrameV1Proxy] = None
         self.frame_flags = self.FRAME_FLAGS(0)
+        # The buffer being captured into, one of `buffers` once they're created
         self.buffer: Optional[WlBufferProxy] = None
+        self.buffer_count = buffers
+        self.buffers: List[WlBufferProxy] = []
+        self.capture_index = 0
+        # Buffer of the last frame captured, and how many leases each buffer is under
+        self.latest_index: Optional[int] = None
+        self.leases: List[int] = []
+        self.capture_deferred = False
+        self.streams: List[FrameStream] = []
+        self.last_frame: Optional[FrameInfo] = None
         self.shm_data: Optional[mmap.mmap] = None
         self.frame_count = 0
         self.total_damage = 0
@@ -50,8 +162,20 @@ class ScreencopyTracker(WaylandClient):
         self.buffer_height = 0
         self.buffer_size = 0
         self.buffer_stride = 0
-        self.pending_damage = 0
+        self.buffer_format = 0
+        self.pending_damage: List[Tuple[int, int, int, int]] = []
         self.pending_flags = self.FRAME_FLAGS(0)
+        # Presentation time, in seconds, damaged area, damage rectangles and whether redundant, of recent frames
+        self.frame_samples = SampleBuffer(("damage", "damage_rects", "redundant"), frame_capacity)
+        self.damage = DamageLog()
+        # Summed area of the damage rectangles, overlaps included
+        self.total_rect_damage = 0
+        self.hasher = FrameHasher() if hash_frames else None
+        self.redundant_frames = 0
+        # The buffer format `hash_frames` gave up on, if any
+        self.unhashable_format: Optional[int] = None
+        # Refresh rate of the output's current mode, in mHz, 0 if unknown
+        self.refresh_mhz = 0
 
     def registry_global(self, registry, id_num: int, iface_name: str, version: int) -> None:
         if iface_name == ZwlrScreencopyManagerV1.name:
@@ -60,6 +184,7 @@ class ScreencopyTracker(WaylandClient):
             )
         elif iface_name == WlOutput.name:
             self.output = registry.bind(id_num, WlOutput, min(WlOutput.version, version))
+            self.output.dispatcher["mode"] = self._output_mode
         elif iface_name == WlShm.name:
             self.shm = registry.bind(id_num, WlShm, min(WlShm.version, version))
 
@@ -68,7 +193,9 @@ class ScreencopyTracker(WaylandClient):
 
     def disconnected(self) -> None:
         if self.shm_data is not None:
-            self.shm_data.close()
+            # Frames from `pixels()` still in use keep the mapping alive until they're gone
+            with suppress(BufferError):
+                self.shm_data.close()
             self.shm_data = None
 
     def _frame_buffer(self, frame, format: int, width: int, height: int, stride: int) -> None:
@@ -77,31 +204,169 @@ class ScreencopyTracker(WaylandClient):
         assert self.buffer_height == 0 or self.buffer_height == height, "Buffer height changed"
         self.buffer_height = height
         self.buffer_stride = stride
+        self.buffer_format = format
+        if self.hasher is not None and format not in self.RGBA_CHANNELS:
+            self.hasher = None
+            self.unhashable_format = format
         buffer_size = stride * height
         assert self.buffer_size == 0 or self.buffer_size == buffer_size, "Buffer size changed"
         self.buffer_size = buffer_size
-        if self.buffer is None:
+        if not self.buffers:
             assert self.shm is not None, "SHM not created"
-            fd = shm_open()
-            os.ftruncate(fd, buffer_size)
-            self.shm_data = mmap.mmap(fd, buffer_size)
-            shm_pool = self.shm.create_pool(fd, buffer_size)
-            libc.close(fd)
-            self.buffer = shm_pool.create_buffer(0, width, height, stride, format)
+            pool_size = buffer_size * self.buffer_count
+            fd = os.memfd_create("screencopy", os.MFD_CLOEXEC)
+            os.ftruncate(fd, pool_size)
+            self.shm_data = mmap.mmap(fd, pool_size)
+            shm_pool = self.shm.create_pool(fd, pool_size)
+            os.close(fd)
+            self.buffers = [
+                shm_pool.create_buffer(index * buffer_size, width, height, stride, format)
+                for index in range(self.buffer_count)
+            ]
+            self.leases = [0] * self.buffer_count
             shm_pool.destroy()
 
+    def pixels(self, rgba: bool = False) -> np.ndarray:
+        """
+        The last frame captured, as a read-only `(height, width, 4)` view of the shared memory
+        it was copied into, top row first, in the buffer's byte order (BGRA for the usual
+        ARGB8888). Nothing is copied, so the view changes once its buffer is captured into
+        again, see `lease` to prevent that.
+
+        With `rgba`, return a copy with the channels in RGBA order instead, e.g. to keep or
+        hand to `PIL.Image.fromarray`.
+        """
+        assert self.frame_count, "No frame captured"
+        return self._buffer_pixels(self.latest_index or 0, self.frame_flags, rgba)
+
+    def lease(self) -> FrameLease:
+        """
+        Keep the last frame captured from being overwritten: its buffer isn't captured into
+        until the lease is released. Capture carries on into the buffers not leased, and
+        waits for a release once all of them are.
+
+        With a single buffer, the capture under way already targets the leased buffer, so
+        only more than one buffer guarantees a frame that doesn't change.
+        """
+        assert self.frame_count and self.leases, "No frame captured"
+        index = self.latest_index or 0
+        self.leases[index] += 1
+        return FrameLease(self, index, self.frame_count, self.frame_flags)
+
+    def _release(self, index: int) -> None:
+        self.leases[index] -= 1
+        self._resume_capture()
+
+    def _resume_capture(self) -> None:
+        if self.capture_deferred and self.shm_data is not None:
+            self.capture_deferred = False
+            self.copy_frame(False)
+
+    async def frames(
+        self, maxsize: int = 1, lossless: bool = False, include_last: bool = False
+    ) -> AsyncGenerator[FrameInfo, None]:
+        """
+        Yield the frames as they are captured, without polling. Up to `maxsize` frames are
+        queued while the consumer is busy. Beyond that, only the latest are kept or, if
+        `lossless`, capture waits for the consumer. With `include_last`, start with the last
+        frame captured before subscribing, if any.
+
+        ```
+        async for frame in tracker.frames(include_last=True):
+            with tracker.lease() as lease:
+                ...
+        ```
+        """
+        stream = self._subscribe(maxsize, lossless, include_last)
+        try:
+            while True:
+                yield await self._get(stream)
+        finally:
+            self._unsubscribe(stream)
+
+    async def next_frame(self) -> FrameInfo:
+        """
+        Wait for the next frame to be captured.
+        """
+        stream = self._subscribe(1, False, False)
+        try:
+            return await self._get(stream)
+        finally:
+            self._unsubscribe(stream)
+
+    def _subscribe(self, maxsize: int, lossless: bool, include_last: bool) -> FrameStream:
+        stream = FrameStream(maxsize, lossless)
+        if include_last and self.last_frame is not None:
+            stream.put(self.last_frame)
+        self.streams.append(stream)
+        return stream
+
+    def _unsubscribe(self, stream: FrameStream) -> None:
+        self.streams.remove(stream)
+        self._resume_capture()
+
+    async def _get(self, stream: FrameStream) -> FrameInfo:
+        while not stream.queue:
+            stream.event.clear()
+            await stream.event.wait()
+        frame = stream.queue.popleft()
+        self._resume_capture()
+        return frame
+
+    def _free_buffer(self) -> Optional[int]:
+        """
+        The buffer to capture into next, the first one after the last frame's that isn't
+        leased, if any.
+        """
+        count = len(self.leases) or 1
+        start = 0 if self.latest_index is None else self.latest_index + 1
+        for index in ((start + i) % count for i in range(count)):
+            if not self.leases or not self.leases[index]:
+                return index
+        return None
+
+    def _buffer_pixels(self, index: int, flags: int, rgba: bool) -> np.ndarray:
+        assert self.shm_data is not None, "No frame captured"
+        assert self.buffer_format in self.RGBA_CHANNELS, f"Unsupported buffer format: {self.buffer_format:#x}"
+        # `frombuffer` holds on to the mapping, so it can't be closed under the frame
+        frame = np.lib.stride_tricks.as_strided(
+            np.frombuffer(self.shm_data, dtype=np.uint8, count=self.buffer_size, offset=index * self.buffer_size),
+            (self.buffer_height, self.buffer_width, 4),
+            (self.buffer_stride, 4, 1),
+            writeable=False,
+        )
+        if self.FRAME_FLAGS.y_invert in self.FRAME_FLAGS(flags):
+            frame = frame[::-1]
+        if rgba:
+            return np.take(frame, self.RGBA_CHANNELS[self.buffer_format], axis=2)
+        return frame
+
+    def _output_mode(self, output, flags: int, width: int, height: int, refresh: int) -> None:
+        if WlOutput.mode.current in WlOutput.mode(flags):
+            self.refresh_mhz = refresh
+
     def _frame_damage(self, frame, x: int, y: int, width: int, height: int) -> None:
-        self.pending_damage += width * height
+        self.pending_damage.append((x, y, width, height))
 
     def _frame_flags(self, frame, flags: int) -> None:
         self.pending_flags = ScreencopyTracker.FRAME_FLAGS(flags)
 
     def _frame_ready(self, frame, tv_sec_hi, tv_sec_lo, tv_nsec) -> None:
         self.frame_count += 1
+        self.latest_index = self.capture_index
         self.frame_flags = self.pending_flags
         self.pending_flags = ScreencopyTracker.FRAME_FLAGS(0)
-        self.total_damage += self.pending_damage if self.pending_damage else (self.buffer_width * self.buffer_height)
-        self.pending_damage = 0
+        rects = np.array(self.pending_damage or [(0, 0, self.buffer_width, self.buffer_height)], dtype=np.int32)
+        self.pending_damage = []
+        damage = self.damage.add_frame(self.frame_count, rects, self.buffer_width, self.buffer_height)
+        self.total_damage += damage
+        self.total_rect_damage += int((rects[:, 2].astype(np.int64) * rects[:, 3]).sum())
+        timestamp = ((tv_sec_hi << 32) | tv_sec_lo) + tv_nsec / 10**9
+        redundant = self._redundant(rects)
+        self.frame_samples.append(timestamp, damage, len(rects), redundant)
+        self.last_frame = FrameInfo(self.frame_count, timestamp, self.frame_flags, rects, redundant)
+        for stream in self.streams:
+            stream.put(self.last_frame)
         assert self.frame is not None, "Frame is None"
         if self.display is not None:
             self.copy_frame(False)
@@ -110,14 +375,23 @@ class ScreencopyTracker(WaylandClient):
     def copy_frame(self, is_initial: bool) -> None:
         assert self.screencopy_manager is not None, f"{ZwlrScreencopyManagerV1.name} not supported"
         assert self.display is not None, "No display"
+        index = self._free_buffer()
+        if index is None or any(stream.lossless and stream.full for stream in self.streams):
+            # Capture again once a buffer is released, or a lossless stream has room
+            self.capture_deferred = True
+            return
         if self.frame is not None:
             self.frame.destroy()
+            self.frame = None
         self.frame = frame = self.screencopy_manager.capture_output(0, self.output)
         frame.dispatcher["buffer"] = self._frame_buffer
         frame.dispatcher["damage"] = self._frame_damage
         frame.dispatcher["flags"] = self._frame_flags
         frame.dispatcher["ready"] = self._frame_ready
         self.display.roundtrip()
+        if self.buffers:
+            self.buffer = self.buffers[index]
+            self.capture_index = index
         assert self.buffer is not None, "No buffer info given"
         if is_initial:
             frame.copy(self.buffer)
@@ -125,6 +399,61 @@ class ScreencopyTracker(WaylandClient):
             frame.copy_with_damage(self.buffer)
         self.display.flush()
 
+    def _redundant(self, rects: np.ndarray) -> bool:
+        """
+        Hash the damaged regions of the frame just captured, before the next capture is
+        requested, and count it if it changed nothing.
+        """
+        if self.hasher is None or self.shm_data is None or not self.buffer_size:
+            return False
+        # The hash doesn't care about channel order, only that pixels are 32-bit
+        pixels = self._buffer_pixels(self.capture_index, 0, False).view(np.uint32)[..., 0]
+        if self.hasher.update(pixels, rects):
+            return False
+        self.redundant_frames += 1
+        return True
+
+    def _pacing_properties(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        timestamps = self.frame_samples.timestamps()
+        intervals = [b - a for a, b in zip(timestamps, timestamps[1:])]
+        if not intervals:
+            return result
+        for pct in self.PERCENTILES:
+            result[f"frame_interval_p{pct}_ms"] = round(percentile(intervals, pct) * 1000, 3)
+        result["frame_interval_max_ms"] = round(max(intervals) * 1000, 3)
+        mean = sum(intervals) / len(intervals)
+        result["frame_jitter_ms"] = round((sum((i - mean) ** 2 for i in intervals) / len(intervals)) ** 0.5 * 1000, 3)
+        if self.refresh_mhz:
+            period = 1000 / self.refresh_mhz
+            result["refresh_rate_hz"] = self.refresh_mhz / 1000
+            result["missed_frames"] = sum(max(0, round(interval / period) - 1) for interval in intervals)
+        return result
+
+    def _damage_properties(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        rects = self.frame_samples.column("damage_rects")
+        if not rects:
+            return result
+        if self.unhashable_format is not None:
+            result["redundant_frames_unsupported_format"] = f"{self.unhashable_format:#x}"
+        if self.hasher is not None:
+            result["redundant_frames"] = self.redundant_frames
+            timestamps = self.frame_samples.timestamps()
+            if timestamps[-1] > timestamps[0]:
+                # Over the frames kept, which is all of them short of `frame_capacity`
+                redundant = sum(1 for frame in self.frame_samples.column("redundant") if frame)
+                result["redundant_frames_per_second"] = round(redundant / (timestamps[-1] - timestamps[0]), 3)
+        for pct in self.PERCENTILES:
+            result[f"damage_rects_p{pct}"] = round(percentile(rects, pct), 3)
+        result["damage_rects_max"] = int(max(rects))
+        if self.total_damage:
+            result["damage_overlap_ratio"] = round(self.total_rect_damage / self.total_damage, 3)
+        return result
+
+    def write_damage_heatmap(self, path: pathlib.Path) -> None:
+        self.damage.write_heatmap(path)
+
     def properties(self) -> Dict[str, Any]:
         total_possible_pixels = max(
             self.frame_count * self.buffer_width * self.buffer_height, self.total_damage, 1  # prevent divide by zero
@@ -134,6 +463,8 @@ class ScreencopyTracker(WaylandClient):
             "resolution": (self.buffer_width, self.buffer_height),
             "total_damage": self.total_damage,
             "percent_damage": self.total_damage * 100.0 / total_possible_pixels,
+            **self._pacing_properties(),
+            **self._damage_properties(),
         }
 
 
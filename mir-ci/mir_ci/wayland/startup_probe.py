@@ -0,0 +1,33 @@
+import asyncio
+import time
+from typing import Optional
+
+from .screencopy_tracker import ScreencopyTracker
+
+
+class StartupProbe(ScreencopyTracker):
+    """
+    Connects to a server that just started and notes when the first registry roundtrip
+    succeeded and, if the server offers screencopy, when the first frame was ready.
+    """
+
+    def __init__(self, display_name: str) -> None:
+        super().__init__(display_name)
+        self.registry_time: Optional[float] = None
+        self.first_frame_time: Optional[float] = None
+        self.first_frame = asyncio.Event()
+
+    @property
+    def can_capture(self) -> bool:
+        return None not in (self.screencopy_manager, self.output, self.shm)
+
+    def connected(self) -> None:
+        self.registry_time = time.monotonic()
+        if self.can_capture:
+            super().connected()
+
+    def _frame_ready(self, frame, tv_sec_hi, tv_sec_lo, tv_nsec) -> None:
+        if self.first_frame_time is None:
+            self.first_frame_time = time.monotonic()
+            self.first_frame.set()
+        super()._frame_ready(frame, tv_sec_hi, tv_sec_lo, tv_nsec)